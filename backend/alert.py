@@ -1,57 +1,137 @@
-import pygame
+import os
 import time
+import queue
+import logging
 import threading
 from notifications import send_notification
 
-# Initialize Pygame for sound
-pygame.mixer.init()
+# Time in seconds to trigger the alert
+detection_threshold = 2
 
-# Load alert sound
-alert_sound = pygame.mixer.Sound("alert.mp3")  # Ensure alert.mp3 exists in the same directory
+# Repeated alerts within this many seconds are merged into a single notification
+ALERT_COALESCE_WINDOW = float(os.getenv("ALERT_COALESCE_WINDOW", 60))
 
-# Variables to track unknown face detection
-last_detection_time = None
-alert_triggered = False
-detection_threshold = 2  # Time in seconds to trigger the alert
 
-# Function to play the alert sound
-def play_alert():
-    pygame.mixer.Sound.play(alert_sound)
+class AlertEngine:
+    """
+    Single worker that turns per-frame detection events into alerts.
 
-# Function to check for unknown faces and trigger alert if necessary
-def check_alert(faces):
-    global last_detection_time, alert_triggered
+    Camera threads only put a small event on a queue; the worker keeps the
+    debounce timer of every camera, plays the alert sound and sends
+    notifications. Alerts raised while a notification went out less than
+    `coalesce_window` seconds ago are merged into one follow-up notification.
+    """
+
+    def __init__(self, detection_threshold=detection_threshold, coalesce_window=ALERT_COALESCE_WINDOW):
+        self.detection_threshold = detection_threshold
+        self.coalesce_window = coalesce_window
+        self._events = queue.Queue(maxsize=10000)
+        self._state = {}  # camera_id -> [first unknown detection time, alert triggered]
+        self._last_notification = 0.0
+        self._coalesced = set()
+        self._sound = None
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self.alerts = 0
+        self.notifications = 0
+        self.dropped_events = 0
+
+    def start(self):
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="alert-engine", daemon=True)
+                self._worker.start()
+        return self
+
+    def submit(self, camera_id, unknown_count, timestamp=None):
+        """Queue the outcome of one frame; never blocks the camera thread."""
+        self.start()
+        try:
+            self._events.put_nowait((camera_id, unknown_count, timestamp or time.time()))
+        except queue.Full:
+            self.dropped_events += 1
+
+    def _play_alert(self):
+        try:
+            if self._sound is None:
+                # Initialize Pygame for sound and load the alert sound
+                import pygame
+                pygame.mixer.init()
+                self._sound = pygame.mixer.Sound("alert.mp3")  # Ensure alert.mp3 exists in the same directory
+            self._sound.play()
+        except Exception as e:
+            logging.error(f"Could not play alert sound: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                event = self._events.get(timeout=1.0)
+            except queue.Empty:
+                event = None
+            if event is not None:
+                self._handle(*event)
+            self._flush_coalesced()
+
+    def _handle(self, camera_id, unknown_count, timestamp):
+        state = self._state.setdefault(camera_id, [None, False])
+        if not unknown_count:
+            # Reset tracking variables if no unknown face is detected
+            state[0] = None
+            state[1] = False
+            return
+
+        if state[0] is None:
+            # Start the detection timer if it's the first detection
+            state[0] = timestamp
+        elif timestamp - state[0] >= self.detection_threshold and not state[1]:
+            state[1] = True
+            self._alert(camera_id, unknown_count)
+
+    def _alert(self, camera_id, unknown_count):
+        self.alerts += 1
+        print(f"ALERT: {unknown_count} unknown face(s) detected on camera {camera_id}!")
+        self._play_alert()
+        if time.time() - self._last_notification < self.coalesce_window:
+            self._coalesced.add(camera_id)
+            return
+        self._notify(f"Alert Check in the server (camera {camera_id})")
 
+    def _flush_coalesced(self):
+        if self._coalesced and time.time() - self._last_notification >= self.coalesce_window:
+            cameras = ", ".join(str(camera_id) for camera_id in sorted(self._coalesced, key=str))
+            self._coalesced.clear()
+            self._notify(f"Alert Check in the server (cameras {cameras})")
+
+    def _notify(self, message):
+        self._last_notification = time.time()
+        self.notifications += 1
+        try:
+            send_notification(message)  # Send notification
+        except Exception as e:
+            logging.error(f"Could not send alert notification: {e}")
+
+    def stats(self):
+        return {
+            "queued_events": self._events.qsize(),
+            "dropped_events": self.dropped_events,
+            "alerts": self.alerts,
+            "notifications": self.notifications,
+            "coalesced_cameras": len(self._coalesced),
+        }
+
+
+alert_engine = AlertEngine()
+
+
+# Function to check for unknown faces and trigger alert if necessary
+def check_alert(faces, camera_id=None):
     # Ensure `faces` is an iterable
     if not isinstance(faces, list):
         print("Invalid input to check_alert; expected a list.")
         return
 
-    current_time = time.time()
-
-    # Check if an unknown face is detected
-    unknown_face_detected = any(
-        isinstance(face, tuple) and len(face) >= 1 and face[0].lower() == 'unknown' for face in faces
+    # Count unknown faces here; timers and side effects run on the alert engine's worker
+    unknown_count = sum(
+        1 for face in faces if isinstance(face, tuple) and len(face) >= 1 and face[0].lower() == 'unknown'
     )
-
-    if unknown_face_detected:
-        # Start the detection timer if it's the first detection
-        if not last_detection_time:
-            last_detection_time = current_time
-        else:
-            # Check if detection has lasted beyond the threshold
-            elapsed_time = current_time - last_detection_time
-            if elapsed_time >= detection_threshold and not alert_triggered:
-                play_alert()
-                send_notification("Alert Check in the server")  # Send notification
-                print("ALERT: Unknown face detected!")
-                alert_triggered = True
-    else:
-        # Reset tracking variables if no unknown face is detected
-        last_detection_time = None
-        alert_triggered = False
-
-
-# Function to run the alert checker in a separate thread
-def start_alert_thread(faces):
-    threading.Thread(target=check_alert, args=(faces,), daemon=True).start()
+    alert_engine.submit(camera_id, unknown_count)
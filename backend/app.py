@@ -8,13 +8,15 @@ from db import db
 from flask_socketio import SocketIO
 from dataset import create_face_dataset
 from camera import start_ip_camera, camera_streams_dict
+from live_stream import live_stream
 import os
 import logging
 import threading
 import cv2
 import time
-from face_recognition import recognize_faces
+from face_recognition import recognize_faces, face_index, health as recognition_health
 from alert import check_alert
+from metrics import LOG_LEVEL
 
 
 # Initialize the directory for saving recordings
@@ -29,7 +31,16 @@ DATASET_DIR = os.path.join(os.getcwd(), "dataset")
 # Initialize SocketIO
 socketio = SocketIO(cors_allowed_origins=["http://10.242.104.90:3000", "http://localhost", "http://10.242.104.90"])
 
-logging.basicConfig(level=logging.DEBUG)
+# Per-camera rooms for the live video frames
+live_stream.init_socketio(socketio)
+
+logging.basicConfig(level=LOG_LEVEL)
+
+
+def enroll_person(person_name, num_images=500):
+    """Capture a new person's images, then add only their embeddings to the live index."""
+    if create_face_dataset(person_name, num_images, 'dataset'):
+        face_index.update_identity(person_name)
 
 
 def create_app():
@@ -39,6 +50,14 @@ def create_app():
     db.init_app(app)
     jwt = JWTManager(app)
 
+    @jwt.token_verification_loader
+    def check_token_scope(jwt_header, jwt_data):
+        # Scoped tokens (the MJPEG stream tokens) are rejected everywhere except their own endpoint
+        return 'scope' not in jwt_data or request.endpoint == 'camera.camera_mjpeg'
+
+    import recordings_index
+    recordings_index.init_app(app)
+
     # Register user routes
     from routes.user_routes import user_bp
     app.register_blueprint(user_bp)
@@ -50,6 +69,12 @@ def create_app():
     def home():
         return jsonify({'message': 'Welcome to the Flask server!'}), 200
 
+    @app.route('/api/health', methods=['GET'])
+    def health():
+        # Readiness probe: 200 once the models are warm and the gallery is loaded
+        report = recognition_health()
+        return jsonify(report), 200 if report["status"] == "ready" else 503
+
     @app.route('/api/admin-dashboard', methods=['GET'])
     @jwt_required()
     def admin_dashboard():
@@ -82,7 +107,7 @@ def create_app():
                 return jsonify({'message': 'Person name is required.'}), 400
             
             # Run the dataset creation in a separate thread to avoid blocking the main thread
-            threading.Thread(target=create_face_dataset, args=(person_name, 500, 'dataset')).start()
+            threading.Thread(target=enroll_person, args=(person_name, 500), daemon=True).start()
             
             return jsonify({'message': f'Started creating dataset for {person_name}.'}), 200 
         except Exception as e:
@@ -126,7 +151,10 @@ def create_app():
             return jsonify({"success": False, "error": "Directory does not exist"}), 404
 
         try:
+            # Delete the images first: if that fails the person stays both on disk and in the index,
+            # instead of disappearing from the index only to come back on the next rebuild
             shutil.rmtree(person_path)
+            face_index.remove_identity(person_name)
             return jsonify({"success": True, "message": f"Dataset for '{person_name}' deleted successfully."}), 200
         except Exception as e:
             return jsonify({"success": False, "error": f"Error deleting dataset: {str(e)}"}), 500
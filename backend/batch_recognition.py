@@ -0,0 +1,126 @@
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+from embedding_index import preprocess_face, get_input_size, embed_tensors
+
+
+class RecognitionRequest:
+    """Face crops from one frame of one camera, waiting for a forward pass."""
+
+    def __init__(self, camera_id, boxes, tensors):
+        self.camera_id = camera_id
+        self.boxes = boxes
+        self.tensors = tensors
+        self.future = Future()
+
+
+class BatchRecognizer:
+    """
+    Gathers face crops from one frame, or from several cameras within a short
+    window, and embeds them all in a single forward pass.
+
+    :param model_name: DeepFace model used for the embeddings.
+    :param classify: Callable mapping a batch of embeddings to a list of (person_name, confidence).
+    :param batch_size: Maximum number of faces per forward pass.
+    :param max_wait: Seconds to wait for more crops before running a partially filled batch.
+    :param embed: Optional callable running the forward pass on an (N, H, W, 3) batch, given
+        the batch and the camera id of each of its rows; defaults to the in-process model.
+    """
+
+    def __init__(self, model_name, classify, batch_size=16, max_wait=0.01, embed=None):
+        self.model_name = model_name
+        self.classify = classify
+        self.embed = embed or (lambda tensors, camera_ids: embed_tensors(tensors, model_name))
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="batch-recognizer", daemon=True)
+                    self._worker.start()
+
+    def submit(self, frame, boxes, camera_id=None):
+        """
+        Queue the faces at `boxes` in `frame` for recognition.
+
+        :return: Future resolving to a list of (person_name, confidence, (x, y, w, h)).
+        """
+        target_size = get_input_size(self.model_name)
+        # Crop and resize on the calling camera thread so the worker only runs the model
+        tensors = [preprocess_face(frame[y:y + h, x:x + w], target_size) for (x, y, w, h) in boxes]
+        request = RecognitionRequest(camera_id, list(boxes), tensors)
+        if not tensors:
+            request.future.set_result([])
+            return request.future
+
+        self._ensure_worker()
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify()
+        return request.future
+
+    def recognize(self, frame, boxes, camera_id=None, timeout=None):
+        """
+        Blocking version of `submit`.
+
+        :raises concurrent.futures.TimeoutError: No result within `timeout` seconds.
+        """
+        return self.submit(frame, boxes, camera_id).result(timeout=timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            batch = [self._pending.popleft()]
+            count = len(batch[0].tensors)
+            deadline = time.monotonic() + self.max_wait
+            while count < self.batch_size:
+                if not self._pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                    continue
+                # Never split one frame's faces across two forward passes
+                if count + len(self._pending[0].tensors) > self.batch_size:
+                    break
+                request = self._pending.popleft()
+                batch.append(request)
+                count += len(request.tensors)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                tensors = np.stack([tensor for request in batch for tensor in request.tensors])
+                camera_ids = [request.camera_id for request in batch for _ in request.tensors]
+                embeddings = np.concatenate([
+                    self.embed(tensors[start:start + self.batch_size], camera_ids[start:start + self.batch_size])
+                    for start in range(0, len(tensors), self.batch_size)
+                ])
+                matches = self.classify(embeddings)
+
+                offset = 0
+                for request in batch:
+                    request_matches = matches[offset:offset + len(request.tensors)]
+                    offset += len(request.tensors)
+                    request.future.set_result([
+                        (person_name, confidence, box)
+                        for (person_name, confidence), box in zip(request_matches, request.boxes)
+                    ])
+            except Exception as e:
+                logging.error(f"Batch recognition error: {e}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
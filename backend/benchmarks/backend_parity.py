@@ -0,0 +1,138 @@
+"""
+Parity of the CPU inference backends against the reference RetinaFace / DeepFace stack.
+
+Run from the backend directory:
+
+    python -m benchmarks.backend_parity --images path/to/test_images --dataset dataset
+    python -m benchmarks.backend_parity --export models/Facenet512.onnx
+
+Detection: every face RetinaFace finds in --images must be found by the
+candidate detector with IoU >= --iou, at a recall of at least --min-recall.
+
+Embedding: face crops from --dataset are embedded by both backends; the
+cosine similarity of each pair must be at least --min-similarity, and both
+backends must give the same `classify_match` decision against the gallery.
+
+Exits non-zero when a check fails, so it can gate a deployment switching
+DETECTION_BACKEND or EMBEDDING_BACKEND.
+"""
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from detection import detect_faces
+from embedding_index import embed_faces, export_onnx_model, l2_normalize, list_dataset_images
+from face_recognition import classify_match, face_recognition_model
+from tracker import iou
+from benchmarks.detection_scale import load_images
+
+
+def detection_parity(images, candidate, iou_threshold, min_face_size):
+    found = 0
+    expected = 0
+    extra = 0
+    timings = {"retinaface": [], candidate: []}
+    for _, image in images:
+        start = time.perf_counter()
+        reference = detect_faces(image, min_face_size=min_face_size, scale=1.0, backend="retinaface")
+        timings["retinaface"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        detections = detect_faces(image, min_face_size=min_face_size, backend=candidate)
+        timings[candidate].append(time.perf_counter() - start)
+
+        expected += len(reference)
+        found += sum(1 for ref in reference if any(iou(ref, det) >= iou_threshold for det in detections))
+        extra += sum(1 for det in detections if not any(iou(ref, det) >= iou_threshold for ref in reference))
+
+    return {
+        "backend": candidate,
+        "reference_faces": expected,
+        "recall": round(found / expected, 4) if expected else None,
+        "extra_detections": extra,
+        "ms_per_image": {name: round(1000 * float(np.mean(t)), 2) for name, t in timings.items() if t},
+    }
+
+
+def embedding_parity(img_paths, candidate):
+    timings = {}
+    embeddings = {}
+    for backend in ("deepface", candidate):
+        embed_faces(img_paths[:1], face_recognition_model, backend=backend)  # warm-up
+        start = time.perf_counter()
+        embeddings[backend] = embed_faces(img_paths, face_recognition_model, backend=backend)
+        timings[backend] = round(1000 * (time.perf_counter() - start) / len(img_paths), 2)
+
+    reference = l2_normalize(embeddings["deepface"])
+    other = l2_normalize(embeddings[candidate])
+    similarity = np.sum(reference * other, axis=1)
+
+    # Same decision against a gallery built from the reference embeddings, leaving each probe out
+    gallery = reference @ reference.T
+    np.fill_diagonal(gallery, -np.inf)
+    cross = other @ reference.T
+    np.fill_diagonal(cross, -np.inf)
+    identities = [path.replace("\\", "/").split("/")[-2] for path in img_paths]
+    agree = 0
+    for i in range(len(img_paths)):
+        a, b = int(np.argmax(gallery[i])), int(np.argmax(cross[i]))
+        decision_a = classify_match([(identities[a], None, float(1.0 - gallery[i, a]))])[0]
+        decision_b = classify_match([(identities[b], None, float(1.0 - cross[i, b]))])[0]
+        agree += decision_a == decision_b
+
+    return {
+        "backend": candidate,
+        "faces": len(img_paths),
+        "min_cosine_similarity": round(float(similarity.min()), 5),
+        "mean_cosine_similarity": round(float(similarity.mean()), 5),
+        "decision_agreement": round(agree / len(img_paths), 4),
+        "ms_per_face": timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Frames for the detection check")
+    parser.add_argument("--dataset", help="Dataset directory for the embedding check")
+    parser.add_argument("--detector", default="opencv_ssd")
+    parser.add_argument("--embedder", default="onnx")
+    parser.add_argument("--iou", type=float, default=0.4)
+    parser.add_argument("--min-face-size", type=int, default=150)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--min-similarity", type=float, default=0.999)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    parser.add_argument("--max-faces", type=int, default=500)
+    parser.add_argument("--export", help="Export the recognition model to this ONNX path and exit")
+    args = parser.parse_args()
+
+    if args.export:
+        export_onnx_model(face_recognition_model, args.export)
+        print(f"Exported {face_recognition_model} to {args.export}")
+        return
+
+    report = {}
+    failures = []
+    if args.images:
+        images = load_images(args.images)
+        size = (args.min_face_size, args.min_face_size)
+        report["detection"] = detection_parity(images, args.detector, args.iou, size)
+        recall = report["detection"]["recall"]
+        if recall is not None and recall < args.min_recall:
+            failures.append(f"detection recall {recall} < {args.min_recall}")
+    if args.dataset:
+        img_paths = [path for _, path in list_dataset_images(args.dataset)][:args.max_faces]
+        report["embedding"] = embedding_parity(img_paths, args.embedder)
+        if report["embedding"]["min_cosine_similarity"] < args.min_similarity:
+            failures.append(f"embedding similarity {report['embedding']['min_cosine_similarity']} < {args.min_similarity}")
+        if report["embedding"]["decision_agreement"] < args.min_agreement:
+            failures.append(f"decision agreement {report['embedding']['decision_agreement']} < {args.min_agreement}")
+
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
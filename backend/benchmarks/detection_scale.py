@@ -0,0 +1,95 @@
+"""
+Detection time vs. scale factor, with recall against full-resolution detection.
+
+Run from the backend directory:
+
+    python -m benchmarks.detection_scale --images path/to/test_images --scales 1.0,0.5,0.32,0.25
+
+Faces found at scale 1.0 are used as ground truth; a face counts as recalled at
+a smaller scale when a detection overlaps it with IoU >= --iou.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+from detection import detect_faces_retinaface, detection_scale
+from tracker import iou
+
+
+def load_images(images_dir):
+    images = []
+    for name in sorted(os.listdir(images_dir)):
+        if name.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+            image = cv2.imread(os.path.join(images_dir, name))
+            if image is not None:
+                images.append((name, image))
+    return images
+
+
+def recall(reference, detections, iou_threshold):
+    if not reference:
+        return None
+    found = sum(1 for ref in reference if any(iou(ref, det) >= iou_threshold for det in detections))
+    return found / len(reference)
+
+
+def run(images, scales, min_face_size, iou_threshold):
+    # Warm up the model so the first timing doesn't include graph building
+    detect_faces_retinaface(images[0][1], min_face_size=min_face_size, scale=1.0)
+
+    reference = {name: detect_faces_retinaface(image, min_face_size=min_face_size, scale=1.0) for name, image in images}
+
+    results = []
+    for scale in scales:
+        timings = []
+        recalls = []
+        for name, image in images:
+            start = time.perf_counter()
+            detections = detect_faces_retinaface(image, min_face_size=min_face_size, scale=scale)
+            timings.append((time.perf_counter() - start) * 1000)
+            image_recall = recall(reference[name], detections, iou_threshold)
+            if image_recall is not None:
+                recalls.append(image_recall)
+        results.append({
+            "scale": scale,
+            "mean_ms": round(sum(timings) / len(timings), 2),
+            "max_ms": round(max(timings), 2),
+            "recall": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="Directory with test images")
+    parser.add_argument("--scales", default="1.0,0.75,0.5,0.32,0.25")
+    parser.add_argument("--min-face-size", type=int, default=150)
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"No images found in {args.images}")
+        sys.exit(1)
+
+    min_face_size = (args.min_face_size, args.min_face_size)
+    scales = [float(scale) for scale in args.scales.split(",")]
+    results = run(images, scales, min_face_size, args.iou)
+
+    print(f"{len(images)} images, min face size {args.min_face_size}px, "
+          f"auto scale {detection_scale(min_face_size):.2f}")
+    print(f"{'scale':>6} {'mean ms':>9} {'max ms':>9} {'recall':>7}")
+    for row in results:
+        recall_text = f"{row['recall']:.3f}" if row['recall'] is not None else "n/a"
+        print(f"{row['scale']:>6.2f} {row['mean_ms']:>9.2f} {row['max_ms']:>9.2f} {recall_text:>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"min_face_size": args.min_face_size, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+End-to-end camera pipeline benchmark: how many cameras can this box handle?
+
+Run from the backend directory:
+
+    python -m benchmarks.end_to_end --cameras 4 --width 1920 --height 1080 --fps 15 --faces 2 --duration 60
+    python -m benchmarks.end_to_end --source clip.mp4 --cameras 8 --output results/clip-8cams.json
+    python -m benchmarks.end_to_end --faces-from dataset --faces 3 --label int8-onnx
+
+Every camera runs the real `CameraPipeline` with `analyze_frame` and
+`publish_frame`, so motion gating, detection, tracking, batched recognition,
+recording and alerting are all exercised. Frames come from a video file
+(looped, resized to --width x --height) or from a synthetic generator that
+moves --faces faces over a noisy background. Faces are crops from
+--faces-from when given, otherwise drawn placeholders that exercise motion
+gating and detection cost but won't be recognised. Sources are paced to --fps
+like a real camera, so a slow pipeline shows up as dropped frames rather than
+as a lower input rate.
+
+The sinks are stubbed and nothing leaves the machine:
+- storage: recordings are written locally and handed to a stub instead of
+  the transcode/upload jobs
+- notifications: the "stub" transport writes them to a temp file
+- sockets: --viewers simulated live viewers per camera acknowledge every frame
+  immediately
+
+The report covers per-stage latency percentiles (capture, inference and, within it,
+detection+recognition, recording and alerting, publish, end to end), achieved FPS and dropped frames
+per camera, and CPU and RSS of this process plus the inference pool workers.
+Samples from the first --warmup seconds are discarded. The JSON is printed and,
+with --output, saved together with the git commit and the backend settings, so
+runs can be compared across commits.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import argparse
+import platform
+import threading
+import subprocess
+import numpy as np
+import cv2
+
+TMP_DIR = tempfile.mkdtemp(prefix="pipeline-benchmark-")
+
+# Stub sinks; set before the application modules read their settings at import
+os.environ["NOTIFICATION_TRANSPORTS"] = "stub"
+os.environ["NOTIFICATION_STUB_PATH"] = os.path.join(TMP_DIR, "notifications.jsonl")
+# Anonymous client that is never contacted, since uploads are stubbed below
+os.environ["STORAGE_EMULATOR_HOST"] = "http://127.0.0.1:9"
+
+import camera
+import camera_session
+from pipeline import CameraPipeline
+from live_stream import live_stream
+from alert import alert_engine
+from face_recognition import start_warm_up
+from embedding_index import list_dataset_images
+from notifications import notification_stats
+import inference_pool
+
+SETTINGS_ENV = (
+    "DETECTION_BACKEND", "EMBEDDING_BACKEND", "EMBEDDING_PRECISION", "INFERENCE_WORKERS",
+    "DOWNSCALED_DETECTION", "RECOGNITION_BATCH_SIZE", "GALLERY_MAX_TEMPLATES", "RECORDING_MODE",
+)
+
+
+class Timings:
+    """Latency samples of one stage, timestamped so the warm-up can be cut off."""
+
+    def __init__(self):
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def add(self, started, elapsed):
+        with self._lock:
+            self._samples.append((started, elapsed))
+
+    def summary(self, since):
+        values = np.array([elapsed for started, elapsed in self._samples if started >= since]) * 1000
+        if not len(values):
+            return {"count": 0}
+        p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+        return {
+            "count": int(len(values)),
+            "mean_ms": round(float(values.mean()), 2),
+            "p50_ms": round(float(p50), 2),
+            "p90_ms": round(float(p90), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(values.max()), 2),
+        }
+
+
+def timed(timings, function):
+    def wrapper(*args, **kwargs):
+        start = time.monotonic()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings.add(start, time.monotonic() - start)
+    return wrapper
+
+
+class SyntheticSource:
+    """Moving faces over a noisy gradient background, pre-rendered so generation isn't measured."""
+
+    def __init__(self, width, height, faces, face_crops, seed, loop_frames=90):
+        rng = np.random.default_rng(seed)
+        x = np.linspace(40, 200, width, dtype=np.float32)
+        y = np.linspace(40, 200, height, dtype=np.float32)[:, None]
+        background = np.dstack([(x + y) / 2, np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width))])
+
+        size = max(160, min(width, height) // 4)  # above the 150 px minimum face size
+        positions = rng.uniform(0, 1, (faces, 2)) * [width - size, height - size]
+        velocities = rng.uniform(-1, 1, (faces, 2)) * size / 10
+        sprites = [self._sprite(face_crops, i, size, rng) for i in range(faces)]
+
+        self.frames = []
+        for _ in range(loop_frames):
+            frame = (background + rng.normal(0, 4, background.shape)).clip(0, 255).astype(np.uint8)
+            for i, sprite in enumerate(sprites):
+                positions[i] += velocities[i]
+                for axis, limit in ((0, width - size), (1, height - size)):
+                    if not 0 <= positions[i][axis] <= limit:
+                        velocities[i][axis] *= -1
+                        positions[i][axis] = min(max(positions[i][axis], 0), limit)
+                px, py = int(positions[i][0]), int(positions[i][1])
+                frame[py:py + size, px:px + size] = sprite
+            self.frames.append(frame)
+        self._index = 0
+
+    @staticmethod
+    def _sprite(face_crops, i, size, rng):
+        if face_crops:
+            return cv2.resize(face_crops[i % len(face_crops)], (size, size))
+        sprite = np.full((size, size, 3), 30, dtype=np.uint8)
+        center = (size // 2, size // 2)
+        cv2.ellipse(sprite, center, (size * 2 // 5, size // 2 - 4), 0, 0, 360, (140, 170, 210), -1)
+        for ex in (size // 3, 2 * size // 3):
+            cv2.circle(sprite, (ex, size * 2 // 5), size // 14, (40, 40, 40), -1)
+        cv2.ellipse(sprite, (size // 2, size * 2 // 3), (size // 6, size // 16), 0, 0, 180, (60, 60, 150), -1)
+        return sprite
+
+    def read(self):
+        frame = self.frames[self._index % len(self.frames)]
+        self._index += 1
+        return frame.copy()
+
+
+class VideoSource:
+    """A local video file, looped and resized to the benchmark resolution."""
+
+    def __init__(self, path, width, height):
+        self.path = path
+        self.size = (width, height)
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise SystemExit(f"Cannot open video {path}")
+
+    def read(self):
+        ok, frame = self.capture.read()
+        if not ok:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+            if not ok:
+                return None
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return frame
+
+
+class PacedCamera:
+    """Delivers frames from a source at a fixed rate, like a camera would, and counts them."""
+
+    def __init__(self, source, fps, stop):
+        self.source = source
+        self.interval = 1.0 / fps
+        self.stop = stop
+        self.delivered = 0
+        self._next = time.monotonic()
+
+    def read(self):
+        if self.stop.is_set():
+            return None
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        # A camera doesn't queue frames for a late reader; skip the missed slots
+        self._next = max(self._next + self.interval, time.monotonic())
+        frame = self.source.read()
+        if frame is None:
+            return None
+        self.delivered += 1
+        return time.monotonic(), frame
+
+
+class StubStorage:
+    """Stands in for transcoding and upload: records what would have been uploaded and deletes it."""
+
+    def __init__(self):
+        self.recordings = 0
+        self.bytes = 0
+
+    def handle_detection(self, path, transcode=True, metadata=None):
+        self.recordings += 1
+        if os.path.exists(path):
+            self.bytes += os.path.getsize(path)
+            os.remove(path)
+
+
+class StubSocketIO:
+    """Socket.IO server stand-in whose clients acknowledge every frame as soon as it is sent."""
+
+    def __init__(self):
+        self.server = self
+        self.frames = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def emit(self, event, data, to=None, namespace=None, callback=None):
+        with self._lock:
+            self.frames += 1
+            self.bytes += len(data[1])
+        if callback is not None:
+            callback()
+
+
+class ResourceSampler:
+    """CPU time and RSS of this process and the inference workers, read from /proc (Linux)."""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.rss = []
+        self._stop = threading.Event()
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._page = os.sysconf("SC_PAGE_SIZE")
+
+    @staticmethod
+    def pids():
+        pool = inference_pool._pool
+        return [os.getpid()] + ([process.pid for process in pool._processes] if pool is not None else [])
+
+    def cpu_seconds(self):
+        total = 0.0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                total += (int(fields[11]) + int(fields[12])) / self._ticks
+            except OSError:
+                pass
+        return total
+
+    def rss_bytes(self):
+        total = 0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    total += int(f.read().split()[1]) * self._page
+            except OSError:
+                pass
+        return total
+
+    def start(self):
+        def run():
+            while not self._stop.wait(self.interval):
+                self.rss.append(self.rss_bytes())
+        threading.Thread(target=run, name="resource-sampler", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def load_face_crops(dataset_path, limit=16):
+    images = list_dataset_images(dataset_path) if dataset_path else []
+    # One image per person first, so different people appear
+    by_person = {}
+    for person, img_path in images:
+        by_person.setdefault(person, img_path)
+    crops = [cv2.imread(img_path) for img_path in list(by_person.values())[:limit]]
+    return [crop for crop in crops if crop is not None]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    storage = StubStorage()
+    camera_session.handle_detection = storage.handle_detection
+    camera_session.RECORDINGS_DIR = TMP_DIR
+    alert_engine._play_alert = lambda: None
+    socketio = StubSocketIO()
+    live_stream.socketio = socketio
+
+    # Load the models and the gallery up front; their cost is reported by /api/health, not here
+    start_warm_up().join()
+
+    face_crops = load_face_crops(args.faces_from)
+    stop = threading.Event()
+    stages = {}
+    cameras = {}
+    for camera_id in range(1, args.cameras + 1):
+        for viewer in range(args.viewers):
+            live_stream.add_viewer(camera_id, f"benchmark-{camera_id}-{viewer}")
+        if args.source == "synthetic":
+            source = SyntheticSource(args.width, args.height, args.faces, face_crops, seed=camera_id)
+        else:
+            source = VideoSource(args.source, args.width, args.height)
+
+        timings = {name: Timings() for name in ("capture", "inference", "publish", "end_to_end")}
+        stages[camera_id] = timings
+        # Capture is the source read/decode only, not the wait for the next frame slot
+        source.read = timed(timings["capture"], source.read)
+        paced = PacedCamera(source, args.fps, stop)
+
+        def infer(item, camera_id=camera_id):
+            captured_at, frame = item
+            frame, tracks = camera.analyze_frame(camera_id, frame)
+            return frame, tracks, captured_at
+
+        def publish(item, camera_id=camera_id, timings=timings):
+            frame, tracks, captured_at = item
+            camera.publish_frame(camera_id, frame, tracks)
+            timings["end_to_end"].add(captured_at, time.monotonic() - captured_at)
+
+        pipeline = CameraPipeline(
+            camera_id,
+            paced.read,
+            timed(timings["inference"], infer),
+            timed(timings["publish"], publish),
+            queue_size=camera.PIPELINE_QUEUE_SIZE,
+        )
+        cameras[camera_id] = (paced, pipeline)
+
+    # Finer stages inside analyze_frame, shared by all cameras
+    shared = {"detection_recognition": Timings(), "recording_update": Timings(), "alerting": Timings()}
+    camera.track_faces = timed(shared["detection_recognition"], camera.track_faces)
+    camera.recognize_faces = timed(shared["recording_update"], camera.recognize_faces)
+    camera.check_alert = timed(shared["alerting"], camera.check_alert)
+
+    sampler = ResourceSampler().start()
+    started = time.monotonic()
+    for paced, pipeline in cameras.values():
+        pipeline.start()
+
+    time.sleep(args.warmup)
+    measured_from = time.monotonic()
+    cpu_start = sampler.cpu_seconds()
+    delivered_start = {camera_id: paced.delivered for camera_id, (paced, _) in cameras.items()}
+    dropped_start = {
+        camera_id: (pipeline.inference_queue.dropped, pipeline.publish_queue.dropped)
+        for camera_id, (_, pipeline) in cameras.items()
+    }
+    sampler.rss.clear()
+
+    time.sleep(args.duration)
+    measured = time.monotonic() - measured_from
+    cpu = sampler.cpu_seconds() - cpu_start
+    stop.set()
+    for paced, pipeline in cameras.values():
+        pipeline.stop()
+    sampler.stop()
+    for camera_id in cameras:
+        camera_session.close_session(camera_id)
+
+    per_camera = {}
+    for camera_id, (paced, pipeline) in cameras.items():
+        timings = stages[camera_id]
+        processed = timings["inference"].summary(measured_from)["count"]
+        published = timings["publish"].summary(measured_from)["count"]
+        per_camera[str(camera_id)] = {
+            "delivered_fps": round((paced.delivered - delivered_start[camera_id]) / measured, 2),
+            "inference_fps": round(processed / measured, 2),
+            "published_fps": round(published / measured, 2),
+            "dropped_before_inference": pipeline.inference_queue.dropped - dropped_start[camera_id][0],
+            "dropped_before_publish": pipeline.publish_queue.dropped - dropped_start[camera_id][1],
+            "stages": {name: stage.summary(measured_from) for name, stage in timings.items()},
+        }
+
+    rss = sampler.rss or [sampler.rss_bytes()]
+    return {
+        "label": args.label,
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": {
+            "source": args.source, "cameras": args.cameras, "width": args.width, "height": args.height,
+            "fps": args.fps, "faces": args.faces, "face_crops": len(face_crops), "viewers": args.viewers,
+            "duration_s": args.duration, "warmup_s": args.warmup,
+        },
+        "settings": {name: os.getenv(name) for name in SETTINGS_ENV},
+        "totals": {
+            "delivered_fps": round(sum(c["delivered_fps"] for c in per_camera.values()), 2),
+            "inference_fps": round(sum(c["inference_fps"] for c in per_camera.values()), 2),
+            "dropped_frames": sum(c["dropped_before_inference"] + c["dropped_before_publish"] for c in per_camera.values()),
+            "cpu_cores_used": round(cpu / measured, 2),
+            "rss_mb_mean": round(float(np.mean(rss)) / 1e6, 1),
+            "rss_mb_peak": round(max(rss) / 1e6, 1),
+            "run_s": round(time.monotonic() - started, 1),
+        },
+        "shared_stages": {name: stage.summary(measured_from) for name, stage in shared.items()},
+        "cameras": per_camera,
+        "sinks": {
+            "recordings": storage.recordings,
+            "recording_bytes": storage.bytes,
+            "socket_frames": socketio.frames,
+            "socket_bytes": socketio.bytes,
+            "notifications": notification_stats(),
+            "alerts": alert_engine.stats(),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="synthetic", help='"synthetic" or a video file path')
+    parser.add_argument("--cameras", type=int, default=1)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=15)
+    parser.add_argument("--faces", type=int, default=1, help="Faces per synthetic frame")
+    parser.add_argument("--faces-from", help="Dataset directory to take synthetic face crops from")
+    parser.add_argument("--viewers", type=int, default=1, help="Simulated live viewers per camera")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds run before measuring")
+    parser.add_argument("--label", default=None)
+    parser.add_argument("--output", help="Also save the JSON report to this path")
+    args = parser.parse_args()
+
+    # The pipeline logs and prints per frame; keep that out of the report and off the measured path
+    stdout = sys.stdout
+    logging.disable(logging.INFO)
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            report = run(args)
+        finally:
+            sys.stdout = stdout
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Recognition accuracy vs. templates per person for the compacted face gallery.
+
+Run from the backend directory:
+
+    python -m benchmarks.gallery_compaction --dataset dataset --templates 0,32,16,8,4,2,1 --mode medoids
+
+Every --holdout-every'th capture of each person is held out as a probe and the
+rest forms the gallery. `create_face_dataset` writes each capture as three
+consecutive augmented images, so a capture is held out as a whole instead of
+leaving its flipped copy in the gallery; any other image file is a capture of
+its own. People listed in --impostors are left out of the gallery entirely and
+should come back as "unknown".
+
+Probes are classified with the live `classify_match`, so the distance threshold
+and the >= 90% rule are the same ones the cameras use. Template count 0 is the
+uncompacted gallery.
+"""
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from embedding_index import list_dataset_images, embed_faces, l2_normalize
+from gallery_compaction import compact_gallery
+from face_recognition import classify_match, face_recognition_model
+from dataset import capture_index
+
+
+def split(images, holdout_every, impostors):
+    # Number each person's captures in order; a file not written by the capture tool is a capture of its own
+    keys = {}
+    for person, img_path in images:
+        keys.setdefault(person, set()).add(capture_index(img_path))
+    capture_numbers = {person: {key: n for n, key in enumerate(sorted(person_keys))} for person, person_keys in keys.items()}
+
+    gallery = []
+    probes = []
+    for i, (person, img_path) in enumerate(images):
+        if person in impostors or capture_numbers[person][capture_index(img_path)] % holdout_every == 0:
+            probes.append(i)
+        else:
+            gallery.append(i)
+    return gallery, probes
+
+
+def evaluate(gallery, probe_embeddings, expected):
+    embeddings, identities, _ = gallery
+    start = time.perf_counter()
+    similarities = probe_embeddings @ embeddings.T
+    nearest = np.argmax(similarities, axis=1)
+    query_ms = (time.perf_counter() - start) * 1000 / max(1, len(probe_embeddings))
+
+    outcomes = {"correct": 0, "wrong": 0, "ignore": 0, "unknown": 0}
+    for row, best, truth in zip(similarities, nearest, expected):
+        person_name, _ = classify_match([(identities[best], None, float(1.0 - row[best]))])
+        if person_name == truth:
+            outcomes["correct"] += 1
+        elif person_name in ("ignore", "unknown"):
+            outcomes[person_name] += 1
+        else:
+            outcomes["wrong"] += 1
+    return outcomes, query_ms
+
+
+def run(dataset, template_counts, mode, holdout_every, impostors):
+    images = list_dataset_images(dataset)
+    if not images:
+        sys.exit(f"No images found in {dataset}")
+
+    embeddings = l2_normalize(embed_faces([img_path for _, img_path in images], face_recognition_model))
+    identities = np.array([person for person, _ in images], dtype=object)
+    img_paths = np.array([img_path for _, img_path in images], dtype=object)
+
+    gallery_rows, probe_rows = split(images, holdout_every, impostors)
+    gallery_rows = np.array(gallery_rows)
+    probe_rows = np.array(probe_rows)
+    probe_embeddings = embeddings[probe_rows]
+    expected = ["unknown" if identities[i] in impostors else identities[i] for i in probe_rows]
+
+    results = []
+    for count in template_counts:
+        start = time.perf_counter()
+        if count:
+            gallery = compact_gallery(
+                embeddings[gallery_rows], identities[gallery_rows], img_paths[gallery_rows], count, mode
+            )
+        else:
+            gallery = (embeddings[gallery_rows], identities[gallery_rows], img_paths[gallery_rows])
+        compaction_s = time.perf_counter() - start
+
+        outcomes, query_ms = evaluate(gallery, probe_embeddings, expected)
+        results.append({
+            "templates_per_person": count or "all",
+            "gallery_rows": len(gallery[1]),
+            "gallery_mb": round(gallery[0].nbytes / 1e6, 3),
+            "accuracy": round(outcomes["correct"] / len(expected), 4),
+            "outcomes": outcomes,
+            "query_ms_per_probe": round(query_ms, 4),
+            "compaction_s": round(compaction_s, 3),
+        })
+    return {"model": face_recognition_model, "mode": mode, "probes": len(expected), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--templates", default="0,32,16,8,4,2,1", help="Comma-separated templates per person, 0 = all")
+    parser.add_argument("--mode", default="medoids", choices=("medoids", "mean"))
+    parser.add_argument("--holdout-every", type=int, default=5, help="Hold out every Nth capture as a probe")
+    parser.add_argument("--impostors", default="", help="Comma-separated people excluded from the gallery")
+    args = parser.parse_args()
+
+    template_counts = [int(count) for count in args.templates.split(",")]
+    impostors = {person for person in args.impostors.split(",") if person}
+    print(json.dumps(run(args.dataset, template_counts, args.mode, args.holdout_every, impostors), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Import time of the web/API tier, guarding against ML stacks creeping back into module imports.
+
+Run from the backend directory:
+
+    python -m benchmarks.import_time --module app --budget 1.0 --runs 3
+
+Each run imports --module in a fresh interpreter with `-X importtime`. The
+script reports the wall time and the slowest imports, and exits non-zero
+when the median exceeds --budget seconds or any of the heavy modules
+(TensorFlow, DeepFace, RetinaFace, PyTorch, CuPy) were imported. Those must
+only be loaded through `model_registry`.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+HEAVY_MODULES = ("tensorflow", "deepface", "retinaface", "torch", "cupy")
+
+
+def import_once(module):
+    code = (
+        "import sys, json, importlib; importlib.import_module(sys.argv[1]); "
+        "print(json.dumps(sorted(m for m in sys.modules if '.' not in m)))"
+    )
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code, module],
+        capture_output=True, text=True, cwd=os.getcwd(),
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, loaded, result.stderr
+
+
+def slowest_imports(importtime_output, top):
+    # Lines look like "import time:  self [us] | cumulative | <indent>package", nested imports are indented
+    rows = []
+    for line in importtime_output.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2][1:]
+        if not name.startswith(" "):
+            rows.append((int(fields[1]), name))
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in sorted(rows, reverse=True)[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget", type=float, default=1.0, help="Maximum median import time in seconds")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest top-level imports to list")
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        elapsed, loaded, importtime_output = import_once(args.module)
+        timings.append(elapsed)
+
+    median = statistics.median(timings)
+    heavy = sorted(name for name in loaded if name in HEAVY_MODULES)
+    report = {
+        "module": args.module,
+        "runs_s": [round(t, 3) for t in timings],
+        "median_s": round(median, 3),
+        "budget_s": args.budget,
+        "heavy_modules_imported": heavy,
+        "slowest_imports": slowest_imports(importtime_output, args.top),
+    }
+    print(json.dumps(report, indent=2))
+
+    if heavy or median > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Microbenchmark of the live-preview encoder: backends x preview widths x JPEG qualities.
+
+Run from the backend directory:
+
+    python -m benchmarks.preview_encoding --image frame.jpg --widths 0,1280,960,640 --qualities 50,35
+
+Without --image a synthetic 1920x1080 frame is used. Width 0 means full resolution.
+Reports ms/frame (resize + encode) and bytes/frame.
+"""
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from preview_encoder import PreviewEncoder, ENCODER_BACKENDS, simplejpeg
+
+
+def synthetic_frame(width=1920, height=1080):
+    # Gradients plus noise and shapes, closer to camera footage than a flat image
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.dstack([(x + y) / 2, np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width))])
+    frame = (frame + rng.normal(0, 12, frame.shape)).clip(0, 255).astype(np.uint8)
+    for i in range(20):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.circle(frame, center, int(rng.integers(20, 150)), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+    return frame
+
+
+def measure(encoder, frame, quality, iterations):
+    preview, _ = encoder.prepare(frame)
+    encoder.encode(preview, quality)  # warm-up
+    sizes = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        preview, _ = encoder.prepare(frame)
+        sizes.append(len(encoder.encode(preview, quality)))
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / iterations, sum(sizes) / len(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Frame to encode; a synthetic 1080p frame by default")
+    parser.add_argument("--backends", default=",".join(ENCODER_BACKENDS))
+    parser.add_argument("--widths", default="0,1280,960,640")
+    parser.add_argument("--qualities", default="70,50,35")
+    parser.add_argument("--subsampling", default="420")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    frame = cv2.imread(args.image) if args.image else synthetic_frame()
+    results = []
+    for backend in args.backends.split(","):
+        if backend == "simplejpeg" and simplejpeg is None:
+            print("simplejpeg is not installed; skipping.")
+            continue
+        for width in (int(w) for w in args.widths.split(",")):
+            encoder = PreviewEncoder(backend=backend, width=width or None, subsampling=args.subsampling)
+            for quality in (int(q) for q in args.qualities.split(",")):
+                ms, size = measure(encoder, frame, quality, args.iterations)
+                results.append({"backend": backend, "width": width or frame.shape[1], "quality": quality,
+                                "ms_per_frame": round(ms, 3), "bytes_per_frame": int(size)})
+
+    print(f"{'backend':>11} {'width':>6} {'quality':>8} {'ms/frame':>9} {'bytes/frame':>12}")
+    for row in results:
+        print(f"{row['backend']:>11} {row['width']:>6} {row['quality']:>8} "
+              f"{row['ms_per_frame']:>9.2f} {row['bytes_per_frame']:>12}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"frame_shape": list(frame.shape), "subsampling": args.subsampling, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Float vs. quantised embedding models: verification accuracy, threshold drift, latency and memory.
+
+Run from the backend directory, after exporting and quantising the model:
+
+    python -m benchmarks.backend_parity --export models/Facenet512.onnx
+    python -m quantization --precision int8 --dataset dataset
+    python -m quantization --precision fp16
+    python -m benchmarks.quantization_eval --dataset dataset --precisions fp32,fp16,int8
+
+The dataset is split by capture with `quantization.split_captures`: the
+captures the int8 model was calibrated on (--calibration-images) are held out
+together with all their augmented copies. Genuine pairs only join different
+captures of a person, never an image and its own flipped or brightened copy.
+Pairs are drawn with a fixed --seed, so reruns on the same dataset give the
+same report.
+
+A pair is accepted when `classify_match` would accept its distance, which is
+the live `threshold = 1` / >= 90% confidence rule. "far_matched_threshold" is
+the distance threshold that gives each variant the same false accept rate as
+fp32 under that rule; its difference from fp32 is the threshold drift.
+"""
+import os
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from model_registry import get_onnx_session, onnx_model_path
+from embedding_index import preprocess_face, get_input_size, l2_normalize
+from face_recognition import classify_match, face_recognition_model
+from quantization import split_captures
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def make_pairs(identities, captures, genuine_limit, impostor_limit, rng):
+    """
+    :param identities: Person of each face.
+    :param captures: Capture of each face; genuine pairs are only drawn across different captures.
+    """
+    by_person = {}
+    for i, person in enumerate(identities):
+        by_person.setdefault(person, []).append(i)
+
+    genuine = [
+        (a, b) for rows in by_person.values() for n, a in enumerate(rows) for b in rows[n + 1:]
+        if captures[a] != captures[b]
+    ]
+    if len(genuine) > genuine_limit:
+        genuine = [genuine[i] for i in rng.choice(len(genuine), genuine_limit, replace=False)]
+
+    impostor = []
+    if len(by_person) > 1:
+        while len(impostor) < impostor_limit:
+            a, b = rng.integers(0, len(identities), 2)
+            if identities[a] != identities[b]:
+                impostor.append((int(a), int(b)))
+    return np.array(genuine, dtype=int).reshape(-1, 2), np.array(impostor, dtype=int).reshape(-1, 2)
+
+
+def embed_all(session, tensors, batch_size):
+    input_name = session.get_inputs()[0].name
+    outputs = [
+        session.run(None, {input_name: tensors[start:start + batch_size]})[0]
+        for start in range(0, len(tensors), batch_size)
+    ]
+    return l2_normalize(np.concatenate(outputs))
+
+
+def accepted(distances):
+    return np.array([classify_match([("probe", None, float(d))])[0] == "probe" for d in distances])
+
+
+def evaluate(precision, tensors, genuine, impostor, batch_size):
+    rss_before = rss_bytes()
+    session = get_onnx_session(face_recognition_model, precision)
+    embed_all(session, tensors[:1], 1)  # warm-up
+    memory = rss_bytes() - rss_before
+
+    start = time.perf_counter()
+    for tensor in tensors[:50]:
+        session.run(None, {session.get_inputs()[0].name: tensor[np.newaxis]})
+    single_ms = 1000 * (time.perf_counter() - start) / min(50, len(tensors))
+
+    start = time.perf_counter()
+    embeddings = embed_all(session, tensors, batch_size)
+    batched_ms = 1000 * (time.perf_counter() - start) / len(tensors)
+
+    genuine_d = 1.0 - np.sum(embeddings[genuine[:, 0]] * embeddings[genuine[:, 1]], axis=1)
+    impostor_d = 1.0 - np.sum(embeddings[impostor[:, 0]] * embeddings[impostor[:, 1]], axis=1)
+    tar = float(accepted(genuine_d).mean()) if len(genuine_d) else None
+    far = float(accepted(impostor_d).mean()) if len(impostor_d) else None
+    correct = accepted(genuine_d).sum() + (~accepted(impostor_d)).sum()
+
+    return embeddings, genuine_d, impostor_d, {
+        "precision": precision,
+        "model_mb": round(os.path.getsize(onnx_model_path(face_recognition_model, precision)) / 1e6, 2),
+        "rss_increase_mb": round(memory / 1e6, 1),
+        "ms_per_face_batch1": round(single_ms, 3),
+        f"ms_per_face_batch{batch_size}": round(batched_ms, 3),
+        "rule_accuracy": round(float(correct) / (len(genuine_d) + len(impostor_d)), 4),
+        "tar": round(tar, 4) if tar is not None else None,
+        "far": round(far, 5) if far is not None else None,
+        "genuine_distance_mean": round(float(genuine_d.mean()), 4) if len(genuine_d) else None,
+        "impostor_distance_mean": round(float(impostor_d.mean()), 4) if len(impostor_d) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--precisions", default="fp32,fp16,int8")
+    parser.add_argument("--calibration-images", type=int, default=300, help="Calibration set size to hold out")
+    parser.add_argument("--max-faces", type=int, default=1000)
+    parser.add_argument("--genuine-pairs", type=int, default=5000)
+    parser.add_argument("--impostor-pairs", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    _, evaluation = split_captures(args.dataset, args.calibration_images)
+    target_size = get_input_size(face_recognition_model)
+    tensors = []
+    identities = []
+    captures = []
+    for capture, (person, img_paths) in enumerate(evaluation):
+        if len(tensors) >= args.max_faces:
+            break
+        for img_path in img_paths:
+            image = cv2.imread(img_path)
+            if image is not None:
+                tensors.append(preprocess_face(image, target_size))
+                identities.append(person)
+                captures.append(capture)
+    if not tensors:
+        raise SystemExit(f"No evaluation images left in {args.dataset}")
+    tensors = np.stack(tensors)
+    genuine, impostor = make_pairs(identities, captures, args.genuine_pairs, args.impostor_pairs, np.random.default_rng(args.seed))
+
+    results = []
+    reference = None
+    for precision in args.precisions.split(","):
+        embeddings, genuine_d, impostor_d, result = evaluate(precision, tensors, genuine, impostor, args.batch_size)
+        if reference is None:
+            reference = (embeddings, genuine_d, impostor_d, result["far"])
+        ref_embeddings, ref_genuine_d, ref_impostor_d, ref_far = reference
+
+        similarity = np.sum(embeddings * ref_embeddings, axis=1)
+        result["cosine_to_reference"] = {"min": round(float(similarity.min()), 5), "mean": round(float(similarity.mean()), 5)}
+        if len(genuine_d):
+            result["genuine_distance_shift"] = round(float(np.mean(genuine_d - ref_genuine_d)), 5)
+        if len(impostor_d) and ref_far is not None:
+            threshold = float(np.quantile(impostor_d, ref_far)) if ref_far > 0 else float(impostor_d.min())
+            ref_threshold = float(np.quantile(ref_impostor_d, ref_far)) if ref_far > 0 else float(ref_impostor_d.min())
+            result["far_matched_threshold"] = round(threshold, 5)
+            result["threshold_drift"] = round(threshold - ref_threshold, 5)
+        results.append(result)
+
+    print(json.dumps({
+        "model": face_recognition_model,
+        "faces": len(tensors),
+        "genuine_pairs": len(genuine),
+        "impostor_pairs": len(impostor),
+        "reference": args.precisions.split(",")[0],
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import cv2
 from vidgear.gears import CamGear
-from face_recognition import recognize_faces
+from face_recognition import recognize_faces, track_faces
+from camera_session import get_session, close_session
+from pipeline import CameraPipeline, camera_pipelines
+from remux_recorder import RECORDING_MODE
+from live_stream import live_stream
+from frame_cache import frame_cache
 from alert import check_alert
+from metrics import stage_timer, LOG_LEVEL, FRAME_DEBUG_LOGGING
+from inference_pool import shutdown_inference_pool
 import logging
 from utils.camera_utils import camera_streams
-from concurrent.futures import ThreadPoolExecutor
 import signal
 import time
 
@@ -13,13 +19,11 @@ camera_streams_dict = {}
 camera_streams = camera_streams
 
 # Initialize logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=LOG_LEVEL)
 
-# JPEG quality as a configurable parameter
-JPEG_QUALITY = 50
-
-# ThreadPoolExecutor for parallel camera processing
-executor = ThreadPoolExecutor(max_workers=5)  # Adjust based on resources
+# Capacity of the queues between the capture, inference and publish stages;
+# 1 means only the latest frame is kept
+PIPELINE_QUEUE_SIZE = 1
 
 # Graceful shutdown handler
 def shutdown_handler(signum, frame):
@@ -27,29 +31,54 @@ def shutdown_handler(signum, frame):
     for stream in camera_streams_dict.values():
         if stream:
             stream.stop()
+    shutdown_inference_pool()
 
 # Register shutdown signals
 signal.signal(signal.SIGINT, shutdown_handler)
 signal.signal(signal.SIGTERM, shutdown_handler)
 
-def process_frame(camera_id, frame, socketio):
-    """Processes a frame: face recognition, alerts, encoding, and emitting."""
-    try:
-        recognized_faces = recognize_faces(frame)
+def analyze_frame(camera_id, frame):
+    """Inference stage: motion gating, face tracking/recognition and alerts."""
+    # Only run detection when something moved or faces are already being tracked
+    session = get_session(camera_id)
+    if session.motion_gate.should_process(frame, active_tracks=bool(session.tracker.tracks)):
+        tracks = track_faces(frame, camera_id)
+    else:
+        tracks = []
+    recognized_faces = recognize_faces(frame, camera_id, tracks)
+
+    check_alert(recognized_faces, camera_id)  # Trigger alerts based on detection
+
+    return frame, tracks
+
+
+def publish_frame(camera_id, frame, tracks):
+    """Publish stage: draw the overlay, encode and send the frame to the camera's subscribers."""
+    # Nobody is watching this camera: skip drawing and encoding entirely
+    if not live_stream.has_subscribers(camera_id):
+        return
+
+    # Shrink to the preview resolution first so drawing and encoding work on fewer pixels
+    encoder = get_session(camera_id).preview_encoder
+    with stage_timer("drawing", camera_id):
+        preview, scale = encoder.prepare(frame)
 
-        for person_name, confidence, (x, y, w, h) in recognized_faces:
-            label = f"{person_name} ({confidence:.2f}%)"
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            cv2.putText(frame, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+        for track in tracks:
+            if track.person_name == "ignore" or not track.identified:
+                continue
+            x, y, w, h = (int(v * scale) for v in track.box)
+            label = f"#{track.track_id} {track.person_name} ({track.confidence:.2f}%)"
+            cv2.rectangle(preview, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            cv2.putText(preview, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
 
-        check_alert(recognized_faces)  # Trigger alerts based on detection
+    live_stream.publish(camera_id, preview, encoder)
 
-        # Encode the frame to JPEG format
-        _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
-        frame_bytes = buffer.tobytes()
 
-        # Emit the frame over socket
-        socketio.emit('video_frame', {'camera_id': camera_id, 'frame': frame_bytes})
+def process_frame(camera_id, frame):
+    """Processes a frame: face recognition, alerts, encoding, and emitting."""
+    try:
+        frame, tracks = analyze_frame(camera_id, frame)
+        publish_frame(camera_id, frame, tracks)
     except Exception as e:
         logging.error(f"Error processing frame for camera {camera_id}: {e}")
 
@@ -64,41 +93,65 @@ def start_ip_camera(app, camera_id, Camera, socketio):
         rtsp_url = camera.rtsp_url
         logging.info(f"Starting stream for camera ID {camera_id} at {rtsp_url}.")
 
-        stream = CamGear(
-            source=rtsp_url,
-            logging=True,
-            backend="FFMPEG",
-            **{"THREADED_QUEUE_MODE": False, "time_delay": 0}
-        ).start()
+        def open_stream():
+            return CamGear(
+                source=rtsp_url,
+                logging=FRAME_DEBUG_LOGGING,
+                backend="FFMPEG",
+                **{"THREADED_QUEUE_MODE": False, "time_delay": 0}
+            ).start()
+
+        stream = open_stream()
 
         if stream.read() is None:
             logging.error(f"Failed to open camera {camera_id} with RTSP URL: {rtsp_url}")
             return
 
         camera_streams_dict[camera_id] = stream
+        streams = {"current": stream}
 
-        try:
+        if RECORDING_MODE == "remux":
+            # Event videos are muxed from the camera's own packets instead of re-encoded frames
+            get_session(camera_id).attach_stream_recorder(rtsp_url)
+
+        def read_frame():
+            # Capture stage: keep reading as fast as the camera delivers, reconnecting on loss
             while camera_id in camera_streams_dict:
-                frame = stream.read()
-                if frame is None:
-                    logging.warning(f"Stream lost for camera {camera_id}. Attempting reconnection.")
+                frame = streams["current"].read()
+                if frame is not None:
+                    return frame
+                logging.warning(f"Stream lost for camera {camera_id}. Attempting reconnection.")
+                streams["current"].stop()
+                time.sleep(5)  # Retry after delay
+                stream = open_stream()
+                if camera_id not in camera_streams_dict:
+                    # Removed while reconnecting
                     stream.stop()
-                    time.sleep(5)  # Retry after delay
-                    stream = CamGear(source=rtsp_url).start()
-                    continue
+                    break
+                # Keep the registry on the live stream, so shutdown and removal stop this one
+                streams["current"] = camera_streams_dict[camera_id] = stream
+            return None
+
+        pipeline = CameraPipeline(
+            camera_id,
+            read_frame,
+            lambda frame: analyze_frame(camera_id, frame),
+            lambda item: publish_frame(camera_id, item[0], item[1]),
+            queue_size=PIPELINE_QUEUE_SIZE,
+        )
+        camera_pipelines[camera_id] = pipeline
 
-                process_frame(camera_id, frame, socketio)
-                time.sleep(0.033)  # ~30 FPS
-
-                #cv2.imshow(f"Camera {camera_id}", frame)
-
-                #if cv2.waitKey(1) & 0xFF == ord('q'):
-                #    break
+        try:
+            pipeline.start().join()
         except Exception as e:
             logging.error(f"Error during stream processing for camera {camera_id}: {e}")
         finally:
-            stream.stop()
-            del camera_streams_dict[camera_id]
+            pipeline.stop()
+            streams["current"].stop()
+            camera_pipelines.pop(camera_id, None)
+            close_session(camera_id)
+            frame_cache.drop_camera(camera_id)
+            camera_streams_dict.pop(camera_id, None)
             logging.info(f"Camera {camera_id} stream stopped.")
 
 def start_web_camera(camera_ip, camera_streams, recognize_faces, check_alert, socketio):
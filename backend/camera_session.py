@@ -0,0 +1,197 @@
+import os
+import time
+import datetime
+import threading
+import cv2
+from camera_settings import get_camera_settings
+from tracker import FaceTracker
+from motion import MotionGate
+from preroll import PrerollBuffer
+from preview_encoder import create_preview_encoder
+from storage import handle_detection
+from remux_recorder import SegmentRecorder
+from metrics import stage_timer
+
+# Path to save recordings
+RECORDINGS_DIR = 'recordings'
+os.makedirs(RECORDINGS_DIR, exist_ok=True)
+
+# Frame rate of the event recordings
+RECORDING_FPS = 20.0
+
+# Seconds an unknown face must be present before recording starts
+RECORDING_START_DELAY = 2
+
+# Frames without unknown faces before a recording is closed
+RECORDING_STOP_FRAMES = 50
+
+# Downscale stream-copied recordings to 720p before upload (a separate encode step)
+TRANSCODE_STREAM_COPY_RECORDINGS = os.getenv("TRANSCODE_STREAM_COPY_RECORDINGS", "0") == "1"
+
+# Seconds before a tracked face that is still in view gets recognised again
+TRACK_REFRESH_INTERVAL = float(os.getenv("TRACK_REFRESH_INTERVAL", 3.0))
+
+
+class CameraSession:
+    """
+    Everything one camera's pipeline keeps between frames: tracker, motion
+    gate, pre-roll buffer, preview encoder and recording writer.
+
+    A session is only touched by its own camera's inference thread, so
+    cameras never share or overwrite each other's state and no locking is
+    needed in the per-frame path.
+    """
+
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        settings = get_camera_settings(camera_id)
+
+        self.tracker = FaceTracker(refresh_interval=TRACK_REFRESH_INTERVAL)
+        self.motion_gate = MotionGate(
+            sensitivity=settings["motion_sensitivity"],
+            threshold=settings["motion_threshold"],
+            roi=settings["motion_roi"],
+            force_interval=settings["motion_force_interval"],
+        )
+        self.preroll = PrerollBuffer(
+            seconds=settings["preroll_seconds"],
+            max_bytes=int(settings["preroll_max_mb"] * 1024 * 1024),
+            fps=RECORDING_FPS,
+        )
+
+        self.preview_encoder = create_preview_encoder(settings)
+
+        # Recording state
+        self.unknown_detected_time = None
+        self.recording = False
+        self.non_detected_counter = 0
+        self.writer = None
+        self.recording_name = None
+        self.recording_started_at = None
+        self.recording_identities = set()
+
+        # Optional stream-copy recorder; when set, events are remuxed from the camera's own packets
+        self.stream_recorder = None
+
+    def attach_stream_recorder(self, source):
+        """Record events by stream copy from `source` instead of re-encoding decoded frames."""
+        segment_dir = os.path.join(RECORDINGS_DIR, "segments", str(self.camera_id))
+        self.stream_recorder = SegmentRecorder(
+            self.camera_id, source, segment_dir, preroll_seconds=self.preroll.seconds
+        ).start()
+
+    def _start_recording(self, frame):
+        self.recording_started_at = datetime.datetime.now()
+        self.recording_identities.clear()
+        formatted_now = self.recording_started_at.strftime("%d-%m-%y-%H-%M-%S")
+        suffix = f"-cam{self.camera_id}" if self.camera_id is not None else ""
+        self.recording_name = os.path.join(RECORDINGS_DIR, f'{formatted_now}{suffix}.mp4')
+        if self.stream_recorder is not None:
+            # The rolling segments already hold the pre-roll; just mark the event start
+            self.stream_recorder.start_event()
+            self.recording = True
+            print(f"Recording started at {formatted_now} (camera {self.camera_id}, stream copy)")
+            return
+
+        frame_size = (frame.shape[1], frame.shape[0])
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        self.writer = cv2.VideoWriter(self.recording_name, fourcc, RECORDING_FPS, frame_size)
+        # Start the video with the buffered footage from before the event
+        self.preroll.flush(self.writer, frame_size)
+        self.recording = True
+        print(f"Recording started at {formatted_now} (camera {self.camera_id})")
+
+    def _recording_metadata(self):
+        return {
+            "camera_id": self.camera_id,
+            "started_at": self.recording_started_at.isoformat(),
+            "ended_at": datetime.datetime.now().isoformat(),
+            "identities": sorted(self.recording_identities),
+        }
+
+    def _stop_recording(self):
+        metadata = self._recording_metadata()
+        if self.stream_recorder is not None:
+            self.stream_recorder.finish_event(
+                self.recording_name,
+                lambda path: handle_detection(path, transcode=TRANSCODE_STREAM_COPY_RECORDINGS, metadata=metadata),
+            )
+        elif self.writer:
+            self.writer.release()
+            self.writer = None
+            print(f"Recording stopped. Video saved: {self.recording_name}")
+            handle_detection(self.recording_name, metadata=metadata)
+        self.recording = False
+
+    def update_recording(self, frame, unknown_faces_present, faces=()):
+        """
+        Start, continue or stop the event recording for this frame.
+
+        :param faces: `(person_name, confidence, box)` of the faces in the frame; the names are
+            collected for the recordings index.
+        """
+        if self.recording:
+            for person_name, _, _ in faces:
+                self.recording_identities.add(person_name)
+        if unknown_faces_present:
+            self.non_detected_counter = 0
+            now = time.monotonic()
+            if self.unknown_detected_time is None:
+                self.unknown_detected_time = now
+            elif now - self.unknown_detected_time >= RECORDING_START_DELAY and not self.recording:
+                self._start_recording(frame)
+        else:
+            self.unknown_detected_time = None
+            self.non_detected_counter += 1
+            if self.non_detected_counter >= RECORDING_STOP_FRAMES and self.recording:
+                self._stop_recording()
+                self.non_detected_counter = 0
+
+        if self.stream_recorder is not None:
+            return
+        with stage_timer("record", self.camera_id):
+            if self.recording and self.writer:
+                self.writer.write(frame)
+            else:
+                self.preroll.push(frame)
+
+    def close(self):
+        """Finish any open recording when the camera stops."""
+        if self.recording:
+            self._stop_recording()
+        if self.stream_recorder is not None:
+            self.stream_recorder.stop()
+        self.preroll.clear()
+
+
+# Sessions of all running cameras, keyed by camera id
+camera_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(camera_id):
+    session = camera_sessions.get(camera_id)
+    if session is None:
+        with _sessions_lock:
+            session = camera_sessions.get(camera_id)
+            if session is None:
+                session = CameraSession(camera_id)
+                camera_sessions[camera_id] = session
+    return session
+
+
+def close_session(camera_id):
+    with _sessions_lock:
+        session = camera_sessions.pop(camera_id, None)
+    if session is not None:
+        session.close()
+
+
+def recording_stats():
+    """Whether each camera is currently writing an event recording."""
+    return {str(camera_id): session.recording for camera_id, session in list(camera_sessions.items())}
+
+
+def motion_stats():
+    """Gated vs. processed frame counters for every camera."""
+    return {str(camera_id): session.motion_gate.stats() for camera_id, session in list(camera_sessions.items())}
@@ -0,0 +1,60 @@
+import os
+import json
+import logging
+import threading
+
+# Optional JSON file with per-camera overrides, e.g.
+# {"default": {"motion_sensitivity": 0.01}, "3": {"motion_roi": [0.0, 0.3, 1.0, 0.7]}}
+CAMERA_SETTINGS_FILE = os.getenv("CAMERA_SETTINGS_FILE", "camera_settings.json")
+
+DEFAULT_CAMERA_SETTINGS = {
+    # Fraction of the region of interest that must change to count as motion
+    "motion_sensitivity": 0.01,
+    # Per-pixel grey-level difference that counts as a change
+    "motion_threshold": 25,
+    # Region of interest as fractions of the frame (x, y, w, h); None means the whole frame
+    "motion_roi": None,
+    # Run detection at least this often (seconds) even without motion
+    "motion_force_interval": 5.0,
+    # Seconds of footage kept before an event so recordings include the person entering
+    "preroll_seconds": 5.0,
+    # Memory cap of the pre-roll buffer, in megabytes
+    "preroll_max_mb": 8,
+    # Live preview encoder: "simplejpeg" (libjpeg-turbo) or "opencv"
+    "preview_encoder": "simplejpeg",
+    # Frames are resized to this width before drawing and encoding; None keeps full resolution
+    "preview_width": 960,
+    # JPEG chroma subsampling of the preview: "444", "422" or "420"
+    "preview_subsampling": "420",
+}
+
+_overrides = None
+_lock = threading.Lock()
+
+
+def _load_overrides():
+    if not os.path.exists(CAMERA_SETTINGS_FILE):
+        return {}
+    try:
+        with open(CAMERA_SETTINGS_FILE) as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"Could not read camera settings {CAMERA_SETTINGS_FILE}: {e}")
+        return {}
+
+
+def reload_camera_settings():
+    global _overrides
+    with _lock:
+        _overrides = _load_overrides()
+
+
+def get_camera_settings(camera_id):
+    """Default settings, updated with the file's "default" section and then the camera's own section."""
+    global _overrides
+    if _overrides is None:
+        reload_camera_settings()
+    settings = dict(DEFAULT_CAMERA_SETTINGS)
+    settings.update(_overrides.get("default", {}))
+    settings.update(_overrides.get(str(camera_id), {}))
+    return settings
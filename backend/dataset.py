@@ -1,7 +1,8 @@
 import cv2
 import os
+import re
 import numpy as np
-from retinaface import RetinaFace  # Import RetinaFace for face detection
+from model_registry import get_retinaface
 
 def is_blurry(image, threshold=100):
     """
@@ -33,20 +34,45 @@ def augment_image(image):
 
     return augmented_images
 
+# create_face_dataset saves every capture as <person>_<n>.jpg, with consecutive n for the
+# augmented copies returned by augment_image (original, flipped, brightness-shifted)
+AUGMENTATIONS_PER_CAPTURE = 3
+IMAGE_NUMBER = re.compile(r"_(\d+)\.[^.]+$")
+
+def image_number(img_path):
+    """
+    The <n> of an image saved by create_face_dataset, or None for other files.
+    """
+    match = IMAGE_NUMBER.search(os.path.basename(img_path))
+    return int(match.group(1)) if match else None
+
+def capture_index(img_path):
+    """
+    Sortable key of the capture an image was augmented from.
+
+    Images of one capture share a key; files not written by create_face_dataset
+    are a capture of their own.
+    """
+    number = image_number(img_path)
+    return (0, number // AUGMENTATIONS_PER_CAPTURE) if number is not None else (1, img_path)
+
 def create_face_dataset(person_name, num_images=200, output_dir='backend/dataset'):
     """
     Captures face images from a webcam using RetinaFace for face detection and saves them in a specified directory.
+
+    :return: Number of images captured, or None if the person already had a dataset.
     """
     person_dir = os.path.join(output_dir, person_name)
 
     if os.path.exists(person_dir):
         print(f"Dataset for '{person_name}' already exists at {person_dir}. Aborting.")
-        return
+        return None
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     os.makedirs(person_dir)
 
+    RetinaFace = get_retinaface()
     cap = cv2.VideoCapture(0)
 
     print(f"Capturing {num_images} images for {person_name}. Press 'q' to quit early.")
@@ -112,3 +138,4 @@ def create_face_dataset(person_name, num_images=200, output_dir='backend/dataset
     print(f"Captured {count} images for {person_name}.")
     cap.release()
     cv2.destroyAllWindows()
+    return count
@@ -0,0 +1,112 @@
+import os
+import cv2
+from model_registry import model_registry, get_retinaface
+
+# Face detector: "retinaface" (reference, TensorFlow) or "opencv_ssd" (OpenCV DNN, CPU only)
+DETECTION_BACKEND = os.getenv("DETECTION_BACKEND", "retinaface")
+
+# Run RetinaFace on a downscaled copy of the frame and crop from the full-resolution one;
+# off until benchmarks/detection_scale.py shows no recall loss on your cameras
+DOWNSCALED_DETECTION = os.getenv("DOWNSCALED_DETECTION", "0") == "1"
+
+# Smallest face size (in pixels, on the downscaled frame) RetinaFace still finds reliably
+DETECTION_MIN_FACE_PX = int(os.getenv("DETECTION_MIN_FACE_PX", 48))
+
+
+def detection_scale(min_face_size, min_detectable=DETECTION_MIN_FACE_PX):
+    """
+    Largest downscale factor that keeps faces of `min_face_size` detectable.
+
+    A face of `min_face_size` pixels should still be at least `min_detectable`
+    pixels after shrinking, so there is no point in running detection at a
+    higher resolution than that.
+    """
+    return min(1.0, min_detectable / float(min(min_face_size)))
+
+
+def detect_faces_retinaface(frame, min_face_size=(150, 150), threshold=0.7, scale=None):
+    """
+    Detect faces using RetinaFace with a minimum face size to shorten the detection range.
+    
+    :param frame: The image frame in which faces are to be detected.
+    :param min_face_size: The minimum size of the face to be detected, default is (100, 100) for closer faces.
+    :param threshold: The confidence threshold for face detection, default is 0.7.
+    :param scale: Factor to shrink the frame by before detection; derived from `min_face_size` when None.
+    :return: List of detected faces in (x, y, w, h) format, in full-resolution frame coordinates.
+    """
+    # RetinaFace (and TensorFlow) are loaded on the first detection, not at import
+    RetinaFace = get_retinaface()
+
+    if scale is None:
+        scale = detection_scale(min_face_size) if DOWNSCALED_DETECTION else 1.0
+
+    if scale < 1.0:
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        # Without this RetinaFace would upscale the small frame back to ~1024px
+        faces = RetinaFace.detect_faces(small, allow_upscaling=False)
+    else:
+        scale = 1.0
+        faces = RetinaFace.detect_faces(frame)
+
+    detected_faces = []
+    if not isinstance(faces, dict):
+        return detected_faces
+
+    frame_h, frame_w = frame.shape[:2]
+    for key in faces:
+        # Extract the facial area and map it back to the original resolution
+        x1, y1, x2, y2 = faces[key]["facial_area"]
+        x1 = max(0, int(x1 / scale))
+        y1 = max(0, int(y1 / scale))
+        x2 = min(frame_w, int(x2 / scale))
+        y2 = min(frame_h, int(y2 / scale))
+        w, h = x2 - x1, y2 - y1
+
+        # Only include faces larger than the minimum size to focus on nearby faces
+        if w >= min_face_size[0] and h >= min_face_size[1]:
+            detected_faces.append((x1, y1, w, h))
+
+    return detected_faces
+
+
+def detect_faces_ssd(frame, min_face_size=(150, 150), threshold=0.7, scale=None):
+    """
+    Detect faces with the OpenCV DNN ResNet-10 SSD from `deploy.prototxt`.
+
+    Takes the same arguments and returns the same boxes as `detect_faces_retinaface`.
+    `scale` is ignored: the network always sees a 300x300 resize of the frame.
+    """
+    net = model_registry.get("opencv_ssd")
+    frame_h, frame_w = frame.shape[:2]
+    blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+    net.setInput(blob)
+    detections = net.forward()
+
+    detected_faces = []
+    for confidence, x1, y1, x2, y2 in detections[0, 0, :, 2:7]:
+        if confidence < threshold:
+            continue
+        x1 = max(0, int(x1 * frame_w))
+        y1 = max(0, int(y1 * frame_h))
+        x2 = min(frame_w, int(x2 * frame_w))
+        y2 = min(frame_h, int(y2 * frame_h))
+        w, h = x2 - x1, y2 - y1
+        if w >= min_face_size[0] and h >= min_face_size[1]:
+            detected_faces.append((x1, y1, w, h))
+    return detected_faces
+
+
+DETECTION_BACKENDS = {
+    "retinaface": detect_faces_retinaface,
+    "opencv_ssd": detect_faces_ssd,
+}
+
+
+def detector_model(backend=None):
+    """Registry name of the model behind `backend` (default: DETECTION_BACKEND)."""
+    return backend or DETECTION_BACKEND
+
+
+def detect_faces(frame, min_face_size=(150, 150), threshold=0.7, scale=None, backend=None):
+    """Detect faces with the configured backend; see `detect_faces_retinaface` for the arguments."""
+    return DETECTION_BACKENDS[backend or DETECTION_BACKEND](frame, min_face_size, threshold, scale)
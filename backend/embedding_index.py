@@ -0,0 +1,419 @@
+import os
+import threading
+import cv2
+import numpy as np
+from gallery_compaction import compact_gallery
+from model_registry import EMBEDDING_PRECISION, deepface_model, onnx_model, get_deepface_model, get_onnx_session
+
+# Directory where the precomputed embedding matrices are persisted
+EMBEDDINGS_DIR = 'embeddings'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Embedding model runtime: "deepface" (reference, TensorFlow) or "onnx" (ONNX Runtime on CPU)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "deepface")
+
+
+class ReadWriteLock:
+    """
+    Writer-preferring read/write lock.
+
+    Any number of camera threads can query the index at the same time, while an
+    index swap waits for the running queries and blocks new ones only for the
+    duration of the swap itself.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+def l2_normalize(vectors):
+    """Return a contiguous float32 copy of `vectors` with unit-length rows."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def list_dataset_images(dataset_path):
+    """Return sorted (person, img_path) pairs for every image in the dataset."""
+    images = []
+    if not os.path.isdir(dataset_path):
+        return images
+    for person_folder in sorted(os.listdir(dataset_path)):
+        person_path = os.path.join(dataset_path, person_folder)
+        if not os.path.isdir(person_path):
+            continue
+        for img_name in sorted(os.listdir(person_path)):
+            if img_name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((person_folder, os.path.join(person_path, img_name)))
+    return images
+
+
+def preprocess_face(face, target_size):
+    """
+    Resize a BGR face crop into the model input tensor layout.
+
+    Mirrors DeepFace's own preprocessing: keep the aspect ratio, pad with black
+    to `target_size` (width, height) and scale pixels to [0, 1].
+    """
+    target_w, target_h = target_size
+    h, w = face.shape[:2]
+    factor = min(target_w / w, target_h / h)
+    resized = cv2.resize(face, (max(1, int(w * factor)), max(1, int(h * factor))))
+
+    tensor = np.zeros((target_h, target_w, 3), dtype=np.float32)
+    top = (target_h - resized.shape[0]) // 2
+    left = (target_w - resized.shape[1]) // 2
+    tensor[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    tensor /= 255.0
+    return tensor
+
+
+# Input size (width, height) of the common models, so preprocessing doesn't have to load the model
+MODEL_INPUT_SIZES = {
+    "Facenet512": (160, 160),
+    "Facenet": (160, 160),
+    "ArcFace": (112, 112),
+    "VGG-Face": (224, 224),
+}
+
+
+def get_model(model_name):
+    """Return the cached DeepFace model wrapper for `model_name`, loading it on first use."""
+    return get_deepface_model(model_name)
+
+
+def get_input_size(model_name):
+    if model_name in MODEL_INPUT_SIZES:
+        return MODEL_INPUT_SIZES[model_name]
+    if EMBEDDING_BACKEND == "onnx":
+        _, height, width, _ = get_onnx_session(model_name).get_inputs()[0].shape
+        return width, height
+    return tuple(get_model(model_name).input_shape)
+
+
+def _embed_deepface(tensors, model_name):
+    model = get_model(model_name)
+    return np.asarray(model.model(tensors, training=False), dtype=np.float32)
+
+
+def _embed_onnx(tensors, model_name):
+    session = get_onnx_session(model_name)
+    outputs = session.run(None, {session.get_inputs()[0].name: np.ascontiguousarray(tensors, dtype=np.float32)})
+    return np.asarray(outputs[0], dtype=np.float32)
+
+
+EMBEDDING_BACKENDS = {
+    "deepface": (deepface_model, _embed_deepface),
+    "onnx": (onnx_model, _embed_onnx),
+}
+
+
+def embedding_model(model_name, backend=None):
+    """Registry name of `model_name` under `backend` (default: EMBEDDING_BACKEND)."""
+    return EMBEDDING_BACKENDS[backend or EMBEDDING_BACKEND][0](model_name)
+
+
+def embed_tensors(tensors, model_name, backend=None):
+    """Run one forward pass over an (N, H, W, 3) batch of preprocessed faces."""
+    return EMBEDDING_BACKENDS[backend or EMBEDDING_BACKEND][1](tensors, model_name)
+
+
+def export_onnx_model(model_name, output_path):
+    """Export the DeepFace Keras model for the "onnx" backend (needs tf2onnx)."""
+    import tf2onnx
+    import tensorflow as tf
+
+    model = get_model(model_name)
+    width, height = get_input_size(model_name)
+    signature = [tf.TensorSpec((None, height, width, 3), tf.float32, name="input")]
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tf2onnx.convert.from_keras(model.model, input_signature=signature, opset=13, output_path=output_path)
+
+
+def embed_faces(faces, model_name, batch_size=32, backend=None):
+    """
+    Compute raw embeddings for a list of BGR face crops or image paths.
+
+    :return: (N, D) float32 array, one row per input face.
+    """
+    target_size = get_input_size(model_name)
+    tensors = []
+    for face in faces:
+        if isinstance(face, str):
+            face = cv2.imread(face)
+            if face is None:
+                raise ValueError("Unreadable image")
+        tensors.append(preprocess_face(face, target_size))
+
+    embeddings = [
+        embed_tensors(np.stack(tensors[start:start + batch_size]), model_name, backend)
+        for start in range(0, len(tensors), batch_size)
+    ]
+    return np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+
+
+def represent(face, model_name):
+    """Compute a raw embedding for an image path or a BGR face crop."""
+    return embed_faces([face], model_name)[0]
+
+
+class IndexSnapshot:
+    """Immutable embedding matrix plus the identity of every row."""
+
+    def __init__(self, embeddings, identities, img_paths):
+        self.embeddings = embeddings  # (N, D) float32, L2-normalised rows
+        self.identities = identities  # (N,) person names
+        self.img_paths = img_paths    # (N,) source image paths
+
+    def __len__(self):
+        return len(self.identities)
+
+
+class EmbeddingIndex:
+    """
+    In-memory face gallery used by `match_face`.
+
+    All enrolled images are embedded once and kept as a single contiguous
+    float32 matrix, so matching a probe face is one matrix-vector product
+    instead of a `DeepFace.find` scan of the dataset directory.
+
+    With `max_templates` set, queries run against a compacted gallery of at
+    most that many templates per person. The full matrix is still what gets
+    persisted and updated incrementally.
+
+    :param max_templates: Templates kept per person; 0 searches every embedding.
+    :param compaction_mode: "medoids" or "mean", see `gallery_compaction`.
+    """
+
+    def __init__(self, dataset_path, model_name, index_dir=EMBEDDINGS_DIR, max_templates=0, compaction_mode="medoids"):
+        self.dataset_path = dataset_path
+        self.model_name = model_name
+        # Each runtime and precision keeps its own gallery, so probes are never compared across them
+        suffix = "" if EMBEDDING_BACKEND == "deepface" else f"_{EMBEDDING_BACKEND}"
+        if EMBEDDING_BACKEND == "onnx" and EMBEDDING_PRECISION != "fp32":
+            suffix += f"_{EMBEDDING_PRECISION}"
+        self.index_path = os.path.join(index_dir, f"index_{model_name}{suffix}.npz")
+        self.max_templates = max_templates
+        self.compaction_mode = compaction_mode
+        self._lock = ReadWriteLock()
+        self._snapshot = IndexSnapshot(
+            np.zeros((0, 0), dtype=np.float32),
+            np.array([], dtype=object),
+            np.array([], dtype=object),
+        )
+        self._full = self._snapshot
+        self._build_lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.snapshot())
+
+    def snapshot(self):
+        self._lock.acquire_read()
+        try:
+            return self._snapshot
+        finally:
+            self._lock.release_read()
+
+    def compact(self, snapshot):
+        """Return the snapshot queries should search for the full `snapshot`."""
+        if not self.max_templates:
+            return snapshot
+        return IndexSnapshot(*compact_gallery(
+            snapshot.embeddings, snapshot.identities, snapshot.img_paths,
+            self.max_templates, self.compaction_mode,
+        ))
+
+    def swap(self, snapshot):
+        """Atomically replace the live snapshot; running queries keep the old one."""
+        # Compact before taking the lock so queries are only blocked for the assignment
+        searched = self.compact(snapshot)
+        self._lock.acquire_write()
+        try:
+            self._full = snapshot
+            self._snapshot = searched
+            self.loaded = True
+        finally:
+            self._lock.release_write()
+
+    def load_or_build(self):
+        """Load the persisted index if it still matches the dataset, otherwise rebuild it."""
+        with self._build_lock:
+            self._load_or_build()
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        with self._build_lock:
+            # Another thread may have finished loading while we waited for the lock
+            if not self.loaded:
+                self._load_or_build()
+
+    def _load_or_build(self):
+        images = list_dataset_images(self.dataset_path)
+        snapshot = self._load(images)
+        if snapshot is None:
+            snapshot = self._build(images)
+            self._save(snapshot)
+        self.swap(snapshot)
+        print(f"Embedding index ready: {len(snapshot)} embeddings, {len(self)} searched ({self.model_name}).")
+
+    def update_identity(self, person):
+        """
+        Re-embed only the images of `person` and splice them into the index.
+
+        The new rows are computed while queries keep using the current
+        snapshot; the swap and the write to disk happen once they are ready.
+        """
+        with self._build_lock:
+            if not self.loaded:
+                # A full load picks the new images up anyway
+                self._load_or_build()
+                return
+            images = [(name, path) for name, path in list_dataset_images(self.dataset_path) if name == person]
+            added = self._build(images)
+            snapshot = self._replace_rows(self._full, person, added)
+            self.swap(snapshot)
+            self._save(snapshot)
+        print(f"Embedding index updated for '{person}': {len(added)} embeddings, {len(snapshot)} total.")
+
+    def remove_identity(self, person):
+        """Drop every row of `person` from the index and persist the result."""
+        with self._build_lock:
+            if not self.loaded:
+                # Nothing in memory yet; the next load notices the missing images
+                return
+            snapshot = self._replace_rows(self._full, person, None)
+            self.swap(snapshot)
+            self._save(snapshot)
+        print(f"Embedding index: removed '{person}', {len(snapshot)} embeddings left.")
+
+    @staticmethod
+    def _replace_rows(snapshot, person, added):
+        keep = snapshot.identities != person
+        parts = [(snapshot.embeddings[keep], snapshot.identities[keep], snapshot.img_paths[keep])]
+        if added is not None:
+            parts.append((added.embeddings, added.identities, added.img_paths))
+        parts = [part for part in parts if len(part[1])]
+        if not parts:
+            return IndexSnapshot(
+                np.zeros((0, 0), dtype=np.float32),
+                np.array([], dtype=object),
+                np.array([], dtype=object),
+            )
+        return IndexSnapshot(
+            np.ascontiguousarray(np.concatenate([part[0] for part in parts]), dtype=np.float32),
+            np.concatenate([part[1] for part in parts]),
+            np.concatenate([part[2] for part in parts]),
+        )
+
+    def _build(self, images, batch_size=64):
+        embeddings = []
+        identities = []
+        img_paths = []
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            try:
+                embeddings.append(embed_faces([path for _, path in chunk], self.model_name))
+                identities.extend(person for person, _ in chunk)
+                img_paths.extend(path for _, path in chunk)
+            except Exception:
+                # Fall back to one image at a time so a single bad file doesn't drop the chunk
+                for person, img_path in chunk:
+                    try:
+                        embeddings.append(embed_faces([img_path], self.model_name))
+                        identities.append(person)
+                        img_paths.append(img_path)
+                    except Exception as e:
+                        print(f"Skipping invalid image {img_path}: {e}")
+
+        if embeddings:
+            matrix = l2_normalize(np.concatenate(embeddings))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        return IndexSnapshot(matrix, np.array(identities, dtype=object), np.array(img_paths, dtype=object))
+
+    def _load(self, images):
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            with np.load(self.index_path, allow_pickle=True) as data:
+                img_paths = data["img_paths"]
+                # Rebuild if images were added or removed since the index was written
+                if sorted(img_paths.tolist()) != sorted(path for _, path in images):
+                    return None
+                return IndexSnapshot(
+                    np.ascontiguousarray(data["embeddings"], dtype=np.float32),
+                    data["identities"],
+                    img_paths,
+                )
+        except Exception as e:
+            print(f"Could not load embedding index {self.index_path}: {e}")
+            return None
+
+    def _save(self, snapshot):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = self.index_path + ".tmp.npz"
+        np.savez(tmp_path, embeddings=snapshot.embeddings, identities=snapshot.identities, img_paths=snapshot.img_paths)
+        os.replace(tmp_path, self.index_path)
+
+    def query(self, embedding, k=1):
+        """
+        Return the k nearest gallery entries for a probe embedding.
+
+        :param embedding: Raw (un-normalised) embedding of the probe face.
+        :param k: Number of neighbours to return.
+        :return: List of (identity, img_path, cosine_distance), nearest first.
+        """
+        return self.query_batch(embedding, k)[0]
+
+    def query_batch(self, embeddings, k=1):
+        """Same as `query` for an (N, D) batch of probes, using a single matrix product."""
+        probes = l2_normalize(embeddings)
+        snapshot = self.snapshot()
+        if len(snapshot) == 0:
+            return [[] for _ in range(len(probes))]
+
+        similarities = probes @ snapshot.embeddings.T
+        k = min(k, similarities.shape[1])
+        results = []
+        for row in similarities:
+            if k < len(row):
+                top = np.argpartition(-row, k - 1)[:k]
+            else:
+                top = np.arange(len(row))
+            top = top[np.argsort(-row[top])]
+            results.append([(snapshot.identities[i], snapshot.img_paths[i], float(1.0 - row[i])) for i in top])
+        return results
@@ -1,48 +1,21 @@
 import os
+import time
 import cv2
-import datetime
+import logging
+import numpy as np
 from PIL import Image
-import pandas as pd
-from alert import start_alert_thread
-from storage import handle_detection
-import tensorflow as tf
-import cupy as cp
-from retinaface import RetinaFace  # Import RetinaFace for face detection
-
-# Set the GPU allocator to enable asynchronous memory allocation
-os.environ['TF_GPU_ALLOCATOR'] = 'cuda_malloc_async'
-
-gpus = tf.config.list_physical_devices('GPU')
-if gpus:
-    try:
-        for gpu in gpus:
-            tf.config.experimental.set_memory_growth(gpu, True)
-        print("TensorFlow GPU ready.")
-    except RuntimeError as e:
-        print(f"TensorFlow error: {e}")
-
-# Test CuPy
-try:
-    gpu_array = cp.zeros((100, 100))
-    print("CuPy GPU ready.")
-except Exception as e:
-    print(f"CuPy error: {e}")
+from camera_session import get_session
+from detection import detect_faces, detector_model
+from model_registry import model_registry
+from metrics import stage_timer, FRAME_DEBUG_LOGGING
 
 # Path to dataset
 dataset_path = 'dataset'
-# Path to save recordings
-RECORDINGS_DIR = 'recordings'
-os.makedirs(RECORDINGS_DIR, exist_ok=True)
-
-# Variables for recording logic
-unknown_detected_time = None
-recording = False
-non_detected_counter = 0
-out = None
-current_recording_name = None
 
 
 def face_database(dataset_path):
+    import pandas as pd
+
     face_db = []
     for person_folder in os.listdir(dataset_path):
         person_path = os.path.join(dataset_path, person_folder)
@@ -59,124 +32,201 @@ def face_database(dataset_path):
     return pd.DataFrame(face_db)
 
 
-def recognize_faces(frame):
-    global unknown_detected_time, recording, non_detected_counter, out, current_recording_name
+def get_tracker(camera_id):
+    return get_session(camera_id).tracker
+
 
-    faces = detect_faces_retinaface(frame, min_face_size=(150, 150))
-    recognized_faces = []
+def track_faces(frame, camera_id=None):
+    """
+    Detect faces and follow them across frames, recognising only tracks whose
+    identity is unknown or stale.
 
-    for (x, y, w, h) in faces:
-        face = frame[y:y + h, x:x + w]
-        person_name, confidence = match_face(face, dataset_path)
-        
-        # Skip ignored faces
-        if person_name != "ignore":
-            recognized_faces.append((person_name, confidence, (x, y, w, h)))
+    :return: List of `Track` objects visible in this frame.
+    """
+    pool = get_inference_pool(face_recognition_model)
+    tracker = get_tracker(camera_id)
+    with stage_timer("detection", camera_id):
+        if pool is not None:
+            # Detection runs in the shared worker pool, scheduled fairly against the other cameras
+            try:
+                faces = pool.run(camera_id, "detect", frame, timeout=INFERENCE_TIMEOUT, min_face_size=(150, 150))
+            except Exception as e:
+                # A stuck or crashed worker: skip detection on this frame and keep the faces seen last
+                logging.warning(f"Face detection skipped for camera {camera_id}: {e!r}")
+                return [track for track in tracker.tracks if track.missed == 0]
+        else:
+            faces = detect_faces(frame, min_face_size=(150, 150))
+    tracks = tracker.update(faces)
+
+    # Until the background warm-up has loaded the gallery, faces are tracked but not recognised yet
+    if not face_index.loaded:
+        return tracks
+
+    stale = [track for track in tracks if tracker.needs_recognition(track, frame)]
+    if stale:
+        try:
+            # All stale faces of the frame go through the model in a single batch
+            with stage_timer("recognition", camera_id):
+                matches = batch_recognizer.recognize(
+                    frame, [track.box for track in stale], camera_id, timeout=INFERENCE_TIMEOUT
+                )
+        except Exception:
+            logging.exception(f"Face matching error (camera {camera_id})")
+            matches = [("unknown", 0.0, track.box) for track in stale]
+        for track, (person_name, confidence, _) in zip(stale, matches):
+            tracker.set_identity(track, frame, person_name, confidence)
+
+    return tracks
+
+
+def recognize_faces(frame, camera_id=None, tracks=None):
+    if tracks is None:
+        tracks = track_faces(frame, camera_id)
+
+    # Skip ignored faces and those not recognised yet
+    recognized_faces = [
+        (track.person_name, track.confidence, track.box)
+        for track in tracks if track.identified and track.person_name != "ignore"
+    ]
 
     unknown_faces_present = any(person_name == 'unknown' for person_name, _, _ in recognized_faces)
 
-    if unknown_faces_present:
-        non_detected_counter = 0
-        if not unknown_detected_time:
-            unknown_detected_time = datetime.datetime.now()
-        else:
-            elapsed_time = (datetime.datetime.now() - unknown_detected_time).total_seconds()
-            if elapsed_time >= 2 and not recording:
-                # Start recording
-                now = datetime.datetime.now()
-                formatted_now = now.strftime("%d-%m-%y-%H-%M-%S")
-                current_recording_name = os.path.join(RECORDINGS_DIR, f'{formatted_now}.mp4')
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out = cv2.VideoWriter(current_recording_name, fourcc, 20.0, (frame.shape[1], frame.shape[0]))
-                recording = True
-                print(f"Recording started at {formatted_now}")
-    else:
-        unknown_detected_time = None
-        non_detected_counter += 1
-        if non_detected_counter >= 50 and recording:
-            if out:
-                out.release()
-                out = None
-                recording = False
-                print(f"Recording stopped. Video saved: {current_recording_name}")
-                handle_detection(current_recording_name)
-            non_detected_counter = 0
-
-    if recording and out:
-        out.write(frame)
-
-    # Trigger alert logic
-    start_alert_thread(recognized_faces)
-
-    # Debug output to verify structure
-    print("Recognized Faces:", recognized_faces)
+    # Recording state lives in the camera's own session, never shared between cameras
+    get_session(camera_id).update_recording(frame, unknown_faces_present, recognized_faces)
+
+    # Debug output to verify structure; per frame, so only when enabled
+    if FRAME_DEBUG_LOGGING:
+        logging.debug(f"Recognized Faces (camera {camera_id}): {recognized_faces}")
 
     return recognized_faces
 
 
-import cv2 
-from deepface import DeepFace
-import torch  # Import torch for checking CUDA
-import pandas as pd  # For handling the DataFrame
+from embedding_index import EmbeddingIndex, represent, embed_tensors, embedding_model
+from inference_pool import get_inference_pool, inference_pool_stats, INFERENCE_TIMEOUT
+from batch_recognition import BatchRecognizer
 
 # Choose the model for face recognition: 'ArcFace' or 'Facenet512'
 face_recognition_model = "Facenet512"  # Change to "ArcFace" for ArcFace
 
+# Templates kept per person when matching (0 keeps every image); see benchmarks/gallery_compaction.py
+GALLERY_MAX_TEMPLATES = int(os.getenv("GALLERY_MAX_TEMPLATES", 0))
+GALLERY_COMPACTION_MODE = os.getenv("GALLERY_COMPACTION_MODE", "medoids")
+
+# Embeddings of every dataset image, loaded once and shared by all camera threads
+face_index = EmbeddingIndex(
+    dataset_path,
+    face_recognition_model,
+    max_templates=GALLERY_MAX_TEMPLATES,
+    compaction_mode=GALLERY_COMPACTION_MODE,
+)
+
 def smooth_frame(frame):
     # Apply Gaussian Blur to smoothen the frame
     return cv2.GaussianBlur(frame, (5, 5), 0)
 
+def classify_match(results):
+    """Turn the nearest-neighbour result of one face into (person_name, confidence)."""
+    if results:
+        identity, _, distance = results[0]
+        threshold = 1  # Distance threshold for recognition
+
+        if distance < threshold:
+            confidence = round((1 - distance / threshold) * 100, 2)  # Confidence as a percentage
+
+            # Ignore confidence scores between 1% and 69%
+            if confidence >= 90:
+                return identity, confidence
+            elif confidence > 0 and confidence < 90:
+                # Ignore mid-range scores
+                return "ignore", 0.0
+
+    # Default to unknown if no match is found
+    return "unknown", 0.0
+
+
+def classify_embeddings(embeddings):
+    """
+    Match a batch of face embeddings against the gallery in one query.
+
+    Faces get no identity (None) while the gallery is still loading; it is only
+    ever loaded by the warm-up, never on a camera thread.
+    """
+    if not face_index.loaded:
+        return [(None, 0.0)] * len(embeddings)
+    return [classify_match(results) for results in face_index.query_batch(embeddings, k=1)]
+
+
 def match_face(face, dataset_path):
     try:
-        # Use the selected face recognition model (either ArcFace or Facenet512)
-        results = DeepFace.find(face, db_path=dataset_path, model_name=face_recognition_model, distance_metric="cosine", enforce_detection=False)
-        
-        if isinstance(results, list) and len(results) > 0:
-            df_results = results[0]  # The first element contains a DataFrame
-            if isinstance(df_results, pd.DataFrame) and not df_results.empty:
-                best_match = df_results.iloc[0]
-                distance = best_match['distance']
-                threshold = 1  # Distance threshold for recognition
-                
-                if distance < threshold:
-                    confidence = round((1 - distance / threshold) * 100, 2)  # Confidence as a percentage
-                    
-                    # Ignore confidence scores between 1% and 69%
-                    if confidence >= 90:
-                        name = os.path.basename(os.path.dirname(best_match['identity']))
-                        return name, confidence
-                    elif confidence > 0 and confidence < 90:
-                        # Ignore mid-range scores
-                        return "ignore", 0.0
-        
-        # Default to unknown if no match is found
-        return "unknown", 0.0
-    
-    except Exception as e:
-        print(f"Face matching error: {e}")
+        # Compare against the precomputed gallery instead of scanning dataset_path with DeepFace.find
+        return classify_embeddings(represent(face, face_recognition_model))[0]
+    except Exception:
+        logging.exception("Face matching error")
         return "unknown", 0.0
 
 
-def detect_faces_retinaface(frame, min_face_size=(150, 150), threshold=0.7):
-    """
-    Detect faces using RetinaFace with a minimum face size to shorten the detection range.
-    
-    :param frame: The image frame in which faces are to be detected.
-    :param min_face_size: The minimum size of the face to be detected, default is (100, 100) for closer faces.
-    :param threshold: The confidence threshold for face detection, default is 0.7.
-    :return: List of detected faces in (x, y, w, h) format.
-    """
-    # Perform face detection with RetinaFace
-    faces = RetinaFace.detect_faces(frame)
-    detected_faces = []
-
-    for key in faces:
-        # Extract the facial area
-        facial_area = faces[key]["facial_area"]
-        x, y, w, h = facial_area
-
-        # Only include faces larger than the minimum size to focus on nearby faces
-        if w >= min_face_size[0] and h >= min_face_size[1]:
-            detected_faces.append((x, y, w - x, h - y))  # Convert to (x, y, w, h) format
-    
-    return detected_faces
\ No newline at end of file
+# Batches the crops of concurrent frames into one forward pass; raise the batch size
+# or wait for more throughput on busy cameras, lower them for latency
+RECOGNITION_BATCH_SIZE = int(os.getenv("RECOGNITION_BATCH_SIZE", 16))
+RECOGNITION_BATCH_MAX_WAIT = float(os.getenv("RECOGNITION_BATCH_MAX_WAIT", 0.01))  # seconds
+
+def embed_batch(tensors, camera_ids):
+    pool = get_inference_pool(face_recognition_model)
+    if pool is None:
+        return embed_tensors(tensors, face_recognition_model)
+
+    # One task per camera, so recognition takes its turn in each camera's round-robin slot
+    rows = {}
+    for row, camera_id in enumerate(camera_ids):
+        rows.setdefault(camera_id, []).append(row)
+    futures = [(indices, pool.submit(camera_id, "embed", tensors[indices])) for camera_id, indices in rows.items()]
+    deadline = time.monotonic() + INFERENCE_TIMEOUT
+    try:
+        results = [future.result(timeout=max(0.0, deadline - time.monotonic())) for _, future in futures]
+    except Exception:
+        for _, future in futures:
+            future.cancel()
+        raise
+    embeddings = np.empty((len(tensors),) + results[0].shape[1:], dtype=results[0].dtype)
+    for (indices, _), result in zip(futures, results):
+        embeddings[indices] = result
+    return embeddings
+
+
+batch_recognizer = BatchRecognizer(
+    face_recognition_model,
+    classify_embeddings,
+    batch_size=RECOGNITION_BATCH_SIZE,
+    max_wait=RECOGNITION_BATCH_MAX_WAIT,
+    embed=embed_batch,
+)
+
+
+def warm_up_models():
+    """Registry names of the models this process runs itself."""
+    if get_inference_pool(face_recognition_model) is not None:
+        # Detection happens in the pool workers, which warm up their own copies;
+        # this process only embeds when (re)building the gallery
+        return [embedding_model(face_recognition_model)]
+    return [detector_model(), embedding_model(face_recognition_model)]
+
+
+def start_warm_up():
+    """Load and exercise the models in the background, then load the embedding index."""
+    return model_registry.start_warm_up(warm_up_models(), then=face_index.load_or_build)
+
+
+def health():
+    """Readiness of the recognition stack, for /api/health."""
+    models = warm_up_models()
+    ready = model_registry.ready(models) and face_index.loaded
+    if model_registry.failed(models):
+        status = "degraded"
+    else:
+        status = "ready" if ready else "starting"
+    return {
+        "status": status,
+        "models": model_registry.status(),
+        "embedding_index": {"loaded": face_index.loaded, "embeddings": len(face_index)},
+        "inference_pool": inference_pool_stats(),
+    }
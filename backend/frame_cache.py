@@ -0,0 +1,70 @@
+import time
+import threading
+
+
+class EncodedFrame:
+    """One encoded frame; `data` is immutable bytes shared by every reader."""
+
+    __slots__ = ("seq", "data", "timestamp")
+
+    def __init__(self, seq, data):
+        self.seq = seq
+        self.data = data
+        self.timestamp = time.monotonic()
+
+
+class FrameCache:
+    """
+    Latest encoded frame per (camera, quality tier).
+
+    The first reader of a frame at a given tier encodes it; every other
+    Socket.IO subscriber and MJPEG viewer of that tier reuses the same bytes,
+    so encoding cost does not grow with the number of viewers.
+    """
+
+    def __init__(self):
+        self._frames = {}
+        self._seq = {}
+        self._lock = threading.Lock()
+        self._encode_locks = {}  # (camera_id, tier) -> lock held while that tier is being encoded
+
+    def next_seq(self, camera_id):
+        """Start a new frame for `camera_id` and return its sequence number."""
+        with self._lock:
+            seq = self._seq.get(camera_id, 0) + 1
+            self._seq[camera_id] = seq
+            return seq
+
+    def get_or_encode(self, camera_id, tier, seq, encode):
+        """Return the encoded frame `seq` at `tier`, calling `encode()` only if nobody has yet."""
+        key = (camera_id, tier)
+        cached = self._frames.get(key)
+        if cached is not None and cached.seq == seq:
+            return cached
+        with self._lock:
+            encode_lock = self._encode_locks.setdefault(key, threading.Lock())
+        # Readers that miss at the same time wait for the first one's bytes instead of encoding again
+        with encode_lock:
+            cached = self._frames.get(key)
+            if cached is not None and cached.seq == seq:
+                return cached
+            encoded = EncodedFrame(seq, encode())
+            with self._lock:
+                current = self._frames.get(key)
+                if current is None or current.seq < seq:
+                    self._frames[key] = encoded
+        return encoded
+
+    def latest(self, camera_id, tier):
+        return self._frames.get((camera_id, tier))
+
+    def drop_camera(self, camera_id):
+        with self._lock:
+            for key in [key for key in self._frames if key[0] == camera_id]:
+                del self._frames[key]
+            for key in [key for key in self._encode_locks if key[0] == camera_id]:
+                del self._encode_locks[key]
+            self._seq.pop(camera_id, None)
+
+
+frame_cache = FrameCache()
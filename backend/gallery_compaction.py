@@ -0,0 +1,121 @@
+import numpy as np
+
+# "medoids": k real embeddings per person; "mean": the person's mean vector plus its outliers
+COMPACTION_MODES = ("medoids", "mean")
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def farthest_points(embeddings, k, start=None):
+    """
+    Greedy farthest-point selection over L2-normalised rows.
+
+    :param start: Index of the first pick; defaults to the row closest to the centroid.
+    :return: Indices of the `k` selected rows.
+    """
+    if start is None:
+        start = int(np.argmax(embeddings @ embeddings.mean(axis=0)))
+    selected = [start]
+    distance = 1.0 - embeddings @ embeddings[start]
+    while len(selected) < min(k, len(embeddings)):
+        pick = int(np.argmax(distance))
+        selected.append(pick)
+        distance = np.minimum(distance, 1.0 - embeddings @ embeddings[pick])
+    return selected
+
+
+def kmedoids(embeddings, k, iterations=10):
+    """
+    Cosine k-medoids over L2-normalised rows.
+
+    Starts from a farthest-point selection, so augmented near-duplicates of the
+    same capture end up in one cluster instead of taking several templates.
+
+    :return: Indices of the medoid rows.
+    """
+    if len(embeddings) <= k:
+        return list(range(len(embeddings)))
+
+    medoids = np.array(farthest_points(embeddings, k))
+    for _ in range(iterations):
+        assignment = np.argmax(embeddings @ embeddings[medoids].T, axis=1)
+        updated = medoids.copy()
+        for cluster in range(k):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members) == 0:
+                continue
+            cluster_embeddings = embeddings[members]
+            # The member with the highest total similarity to the rest of its cluster
+            updated[cluster] = members[int(np.argmax((cluster_embeddings @ cluster_embeddings.T).sum(axis=1)))]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    return medoids.tolist()
+
+
+def mean_with_outliers(embeddings, k, outlier_distance=0.3):
+    """
+    The normalised mean of all rows, plus up to `k - 1` rows that the mean represents poorly.
+
+    :return: (templates, source_indices), where the mean's source is the row nearest to it.
+    """
+    mean = _normalize(embeddings.mean(axis=0, keepdims=True))[0]
+    distance = 1.0 - embeddings @ mean
+    templates = [mean]
+    sources = [int(np.argmin(distance))]
+
+    outliers = np.flatnonzero(distance > outlier_distance)
+    if k > 1 and len(outliers):
+        picks = farthest_points(embeddings[outliers], k - 1, start=int(np.argmax(distance[outliers])))
+        templates.extend(embeddings[outliers[picks]])
+        sources.extend(outliers[picks].tolist())
+    return np.stack(templates).astype(np.float32), sources
+
+
+def compact_embeddings(embeddings, max_templates, mode="medoids", outlier_distance=0.3):
+    """
+    Reduce one person's embeddings to at most `max_templates` representative rows.
+
+    :return: (templates, source_indices) with L2-normalised template rows.
+    """
+    if mode not in COMPACTION_MODES:
+        raise ValueError(f"Unknown compaction mode '{mode}', expected one of {COMPACTION_MODES}")
+    if len(embeddings) <= max_templates and mode == "medoids":
+        return embeddings, list(range(len(embeddings)))
+    if mode == "mean":
+        return mean_with_outliers(embeddings, max_templates, outlier_distance)
+    medoids = kmedoids(embeddings, max_templates)
+    return embeddings[medoids], medoids
+
+
+def compact_gallery(embeddings, identities, img_paths, max_templates, mode="medoids", outlier_distance=0.3):
+    """
+    Compact every identity of a gallery independently.
+
+    :param embeddings: (N, D) float32 matrix of L2-normalised rows.
+    :param identities: (N,) person name of each row.
+    :param img_paths: (N,) source image of each row; templates keep the path of the row they came from.
+    :return: (embeddings, identities, img_paths) of the compacted gallery.
+    """
+    if len(identities) == 0:
+        return embeddings, identities, img_paths
+
+    kept_embeddings = []
+    kept_identities = []
+    kept_paths = []
+    for person in np.unique(identities):
+        rows = np.flatnonzero(identities == person)
+        templates, sources = compact_embeddings(embeddings[rows], max_templates, mode, outlier_distance)
+        kept_embeddings.append(templates)
+        kept_identities.extend([person] * len(templates))
+        kept_paths.extend(img_paths[rows[sources]])
+
+    return (
+        np.ascontiguousarray(np.concatenate(kept_embeddings), dtype=np.float32),
+        np.array(kept_identities, dtype=object),
+        np.array(kept_paths, dtype=object),
+    )
@@ -0,0 +1,335 @@
+import os
+import time
+import logging
+import threading
+import itertools
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+import numpy as np
+
+# Number of model worker processes shared by all cameras; 0 runs inference on the camera threads
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 2))
+
+# Seconds a camera waits for a pool result before skipping the frame
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", 5))
+
+# Shared memory blocks kept for reuse; older ones are unlinked beyond this
+INFERENCE_FREE_BLOCKS = int(os.getenv("INFERENCE_FREE_BLOCKS", 16))
+
+# Seconds between checks that every worker process is still alive
+WORKER_CHECK_INTERVAL = 1.0
+
+
+def _attach(shm_name):
+    # Spawned workers share the parent's resource tracker, where the block is already registered;
+    # unregistering it here would break the parent's own unlink when it evicts the block
+    return shared_memory.SharedMemory(name=shm_name)
+
+
+def _worker_main(worker_id, task_queue, result_queue, model_name):
+    """Entry point of a worker process: load the models once, then serve tasks."""
+    from detection import detect_faces, detector_model
+    from embedding_index import embed_tensors, embedding_model
+    from model_registry import model_registry
+
+    # Warm up both models so the first real frame doesn't pay for graph building
+    model_registry.warm_up([detector_model(), embedding_model(model_name)])
+    result_queue.put((None, worker_id, "ready", None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, kind, shm_name, shape, dtype, kwargs = task
+        try:
+            shm = _attach(shm_name)
+            try:
+                array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                if kind == "detect":
+                    result = detect_faces(array, **kwargs)
+                elif kind == "embed":
+                    result = embed_tensors(array, model_name)
+                else:
+                    raise ValueError(f"Unknown task kind {kind}")
+                del array
+            finally:
+                shm.close()
+            result_queue.put((task_id, worker_id, result, None))
+        except Exception as e:
+            result_queue.put((task_id, worker_id, None, repr(e)))
+
+
+class InferenceTask:
+    def __init__(self, task_id, camera_id, kind, shm, shape, dtype, kwargs):
+        self.task_id = task_id
+        self.camera_id = camera_id
+        self.kind = kind
+        self.shm = shm
+        self.shape = shape
+        self.dtype = dtype
+        self.kwargs = kwargs
+        self.worker_id = None
+        self.future = Future()
+
+
+class InferencePool:
+    """
+    Fixed-size pool of worker processes, each holding warm detection and
+    embedding models, shared by every camera.
+
+    Frames and face batches are handed over through shared memory and results
+    come back through futures. Pending tasks are queued per camera and
+    dispatched round-robin, so one busy camera cannot starve the others.
+    A worker that dies is respawned, and the tasks it was running fail
+    instead of leaving their cameras waiting.
+    """
+
+    def __init__(self, num_workers, model_name):
+        self.num_workers = num_workers
+        self.model_name = model_name
+        self._ctx = mp.get_context("spawn")
+        self._result_queue = self._ctx.Queue()
+        self._task_queues = []
+        self._processes = []
+        self._idle = deque()
+        self._pending = {}        # camera_id -> deque of tasks
+        self._ready_cameras = deque()  # round-robin order of cameras with pending tasks
+        self._in_flight = {}      # task_id -> task
+        self._free_blocks = deque()  # reusable SharedMemory blocks, most recently released last
+        self._completed = {}      # camera_id -> completed task count
+        self._cond = threading.Condition()
+        self._ids = itertools.count()
+        self._running = False
+        self.ready_workers = 0
+        self.restarts = 0
+        self.cancelled = 0
+
+    def start(self):
+        for worker_id in range(self.num_workers):
+            self._task_queues.append(None)
+            self._processes.append(None)
+            self._spawn(worker_id)
+        self._running = True
+        threading.Thread(target=self._dispatch, name="inference-dispatch", daemon=True).start()
+        threading.Thread(target=self._collect, name="inference-collect", daemon=True).start()
+        threading.Thread(target=self._watch, name="inference-watch", daemon=True).start()
+        return self
+
+    def _spawn(self, worker_id):
+        # A fresh queue each time: a worker killed inside get() can leave the old one unusable
+        task_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, task_queue, self._result_queue, self.model_name),
+            name=f"inference-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._task_queues[worker_id] = task_queue
+        self._processes[worker_id] = process
+
+    @staticmethod
+    def _block_size(nbytes):
+        # Power-of-two size classes, so varying batch sizes share a handful of blocks
+        return max(4096, 1 << (nbytes - 1).bit_length())
+
+    def _get_block(self, nbytes):
+        size = self._block_size(nbytes)
+        with self._cond:
+            for shm in reversed(self._free_blocks):
+                if shm.size == size:
+                    self._free_blocks.remove(shm)
+                    return shm
+        return shared_memory.SharedMemory(create=True, size=size)
+
+    def _release_block(self, shm):
+        with self._cond:
+            self._free_blocks.append(shm)
+            evicted = self._free_blocks.popleft() if len(self._free_blocks) > INFERENCE_FREE_BLOCKS else None
+        if evicted is not None:
+            evicted.close()
+            evicted.unlink()
+
+    def submit(self, camera_id, kind, array, **kwargs):
+        """
+        Queue `array` for a worker.
+
+        :param camera_id: Scheduling key; tasks of different cameras are served round-robin.
+        :param kind: "detect" for a BGR frame, "embed" for a batch of preprocessed faces.
+        :return: Future resolving to the worker's result. Cancelling it before a worker
+            has picked the task up drops the task.
+        """
+        array = np.ascontiguousarray(array)
+        shm = self._get_block(max(1, array.nbytes))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+
+        task = InferenceTask(next(self._ids), camera_id, kind, shm, array.shape, array.dtype.str, kwargs)
+        with self._cond:
+            queue = self._pending.setdefault(camera_id, deque())
+            if not queue:
+                self._ready_cameras.append(camera_id)
+            queue.append(task)
+            self._cond.notify_all()
+        return task.future
+
+    def run(self, camera_id, kind, array, timeout=INFERENCE_TIMEOUT, **kwargs):
+        """
+        Blocking `submit`.
+
+        :raises concurrent.futures.TimeoutError: No result within `timeout` seconds; the task
+            is dropped if it is still queued.
+        """
+        future = self.submit(camera_id, kind, array, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def _dispatch(self):
+        while self._running:
+            with self._cond:
+                while self._running and not (self._idle and self._ready_cameras):
+                    self._cond.wait()
+                if not self._running:
+                    return
+                camera_id = self._ready_cameras.popleft()
+                queue = self._pending[camera_id]
+                task = queue.popleft()
+                if queue:
+                    # Back of the line: other cameras get a turn first
+                    self._ready_cameras.append(camera_id)
+                if not task.future.set_running_or_notify_cancel():
+                    # The camera gave up waiting; don't spend a worker on it
+                    self.cancelled += 1
+                    cancelled = True
+                else:
+                    cancelled = False
+                    worker_id = self._idle.popleft()
+                    task.worker_id = worker_id
+                    self._in_flight[task.task_id] = task
+                    task_queue = self._task_queues[worker_id]
+            if cancelled:
+                self._release_block(task.shm)
+                continue
+            task_queue.put((task.task_id, task.kind, task.shm.name, task.shape, task.dtype, task.kwargs))
+
+    def _collect(self):
+        while self._running:
+            try:
+                task_id, worker_id, result, error = self._result_queue.get()
+            except (EOFError, OSError):
+                return
+            with self._cond:
+                task = self._in_flight.pop(task_id, None) if task_id is not None else None
+                if task is not None:
+                    self._completed[task.camera_id] = self._completed.get(task.camera_id, 0) + 1
+                    self._idle.append(worker_id)
+                elif task_id is None and result == "ready":
+                    self.ready_workers += 1
+                    self._idle.append(worker_id)
+                self._cond.notify_all()
+            if task is None:
+                # Either a worker came up, or a late result of a task already failed by `_watch`
+                if task_id is None and result == "ready":
+                    logging.info(f"Inference worker {worker_id} ready.")
+                continue
+            self._release_block(task.shm)
+            if error:
+                task.future.set_exception(RuntimeError(error))
+            else:
+                task.future.set_result(result)
+
+    def _watch(self):
+        while self._running:
+            time.sleep(WORKER_CHECK_INTERVAL)
+            for worker_id, process in enumerate(self._processes):
+                if self._running and not process.is_alive():
+                    self._restart(worker_id, process.exitcode)
+
+    def _restart(self, worker_id, exitcode):
+        with self._cond:
+            if worker_id in self._idle:
+                self._idle.remove(worker_id)
+                self.ready_workers -= 1
+            lost = [task for task in self._in_flight.values() if task.worker_id == worker_id]
+            for task in lost:
+                del self._in_flight[task.task_id]
+            if lost:
+                # A worker with a task is not in the idle list, but was ready
+                self.ready_workers -= 1
+            self.restarts += 1
+        logging.error(
+            f"Inference worker {worker_id} died (exit code {exitcode}); failing {len(lost)} task(s) and restarting it."
+        )
+        for task in lost:
+            self._release_block(task.shm)
+            task.future.set_exception(RuntimeError(f"Inference worker {worker_id} died"))
+        self._spawn(worker_id)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.num_workers,
+                "ready_workers": self.ready_workers,
+                "restarts": self.restarts,
+                "cancelled": self.cancelled,
+                "idle_workers": len(self._idle),
+                "in_flight": len(self._in_flight),
+                "pending": {str(camera_id): len(queue) for camera_id, queue in self._pending.items()},
+                "completed": {str(camera_id): count for camera_id, count in self._completed.items()},
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            # Nobody will answer these any more; wake their cameras
+            abandoned = list(self._in_flight.values()) + [task for queue in self._pending.values() for task in queue]
+            self._in_flight.clear()
+            self._pending.clear()
+            self._ready_cameras.clear()
+        for task in abandoned:
+            if not task.future.done():
+                task.future.set_exception(RuntimeError("Inference pool shut down"))
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for shm in list(self._free_blocks) + [task.shm for task in abandoned]:
+            shm.close()
+            shm.unlink()
+        self._free_blocks.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool(model_name):
+    """Shared pool, started on first use; None when INFERENCE_WORKERS is 0."""
+    global _pool
+    if INFERENCE_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = InferencePool(INFERENCE_WORKERS, model_name).start()
+    return _pool
+
+
+def shutdown_inference_pool():
+    """Stop the worker processes and free their shared memory; called on server shutdown."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def inference_pool_stats():
+    return _pool.stats() if _pool is not None else {"workers": 0}
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import uuid
+import heapq
+import logging
+import itertools
+import threading
+import subprocess
+from collections import deque
+
+# Directory where pending jobs are persisted so they survive restarts
+JOBS_DIR = 'jobs'
+
+
+def run_niced(args, nice=10):
+    """Run a command (e.g. a compiled ffmpeg invocation) at a lower CPU priority."""
+    if os.name == 'nt':
+        result = subprocess.run(args, capture_output=True, creationflags=subprocess.BELOW_NORMAL_PRIORITY_CLASS)
+    else:
+        # nice(1) rather than preexec_fn, which can deadlock a multithreaded parent between fork and exec
+        result = subprocess.run(["nice", "-n", str(nice), *args], capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{args[0]} exited with {result.returncode}: {result.stderr.decode(errors='replace')[-500:]}")
+
+
+class Job:
+    def __init__(self, kind, payload, priority=10, job_id=None, attempts=0, created_at=None, next_run=0.0):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.priority = priority
+        self.attempts = attempts
+        self.created_at = created_at or time.time()
+        self.next_run = next_run
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "payload": self.payload,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "next_run": self.next_run,
+        }
+
+
+class JobQueue:
+    """
+    Persistent background job queue with a fixed number of worker threads.
+
+    Every job is written to `jobs_dir` before it is queued and only removed
+    once it succeeds, so pending work is picked up again after a restart.
+    Lower `priority` values run first. Failed jobs are retried with
+    exponential backoff and moved to `jobs_dir/failed` after `max_attempts`.
+
+    :param workers: Number of jobs that may run at the same time.
+    :param backoff: Delay in seconds before the first retry; doubles on every attempt.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, workers=2, max_attempts=5, backoff=5.0):
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._handlers = {}
+        self._ready = []    # (priority, seq, job) of jobs that may run now
+        self._delayed = []  # (next_run, seq, job) of jobs waiting for a retry
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._started = False
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._latencies = deque(maxlen=500)
+
+    def register(self, kind, handler):
+        """`handler(payload)` runs the job; it may update `payload` to keep progress across retries."""
+        self._handlers[kind] = handler
+
+    def _path(self, job):
+        return os.path.join(self.jobs_dir, f"{job.job_id}.json")
+
+    def _persist(self, job):
+        tmp_path = self._path(job) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, self._path(job))
+
+    def _push(self, job):
+        with self._cond:
+            if job.next_run <= time.time():
+                heapq.heappush(self._ready, (job.priority, next(self._seq), job))
+            else:
+                heapq.heappush(self._delayed, (job.next_run, next(self._seq), job))
+            self._cond.notify()
+
+    def submit(self, kind, payload, priority=10):
+        self.start()
+        job = Job(kind, payload, priority)
+        self._persist(job)
+        self._push(job)
+        return job.job_id
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return self
+            self._started = True
+        os.makedirs(os.path.join(self.jobs_dir, "failed"), exist_ok=True)
+
+        # Resume jobs left over from a previous run
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name)) as f:
+                    job = Job(**json.load(f))
+                job.next_run = 0.0
+                self._push(job)
+            except Exception as e:
+                logging.error(f"Could not resume job {name}: {e}")
+
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+        return self
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                now = time.time()
+                # Retries that became due join the others by priority; the rest don't block them
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, seq, job = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (job.priority, seq, job))
+                if self._ready:
+                    self.running += 1
+                    return heapq.heappop(self._ready)[2]
+                timeout = self._delayed[0][0] - now if self._delayed else 60
+                self._cond.wait(max(0.1, timeout))
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            try:
+                handler = self._handlers[job.kind]
+                handler(job.payload)
+            except Exception as e:
+                job.attempts += 1
+                if job.attempts >= self.max_attempts:
+                    logging.error(f"Job {job.kind} {job.job_id} failed permanently: {e}")
+                    self.failed += 1
+                    os.replace(self._path(job), os.path.join(self.jobs_dir, "failed", f"{job.job_id}.json"))
+                else:
+                    delay = self.backoff * 2 ** (job.attempts - 1)
+                    logging.warning(f"Job {job.kind} {job.job_id} failed ({e}); retrying in {delay:.0f}s")
+                    self.retried += 1
+                    job.next_run = time.time() + delay
+                    self._persist(job)
+                    self._push(job)
+            else:
+                with self._cond:
+                    self.completed += 1
+                    self._latencies.append(time.time() - job.created_at)
+                try:
+                    os.remove(self._path(job))
+                except OSError:
+                    pass
+            finally:
+                with self._cond:
+                    self.running -= 1
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._ready) + len(self._delayed)
+            latencies = list(self._latencies)
+        latencies.sort()
+        return {
+            "queued": queued,
+            "running": self.running,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "latency_avg_s": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "latency_p95_s": round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+        }
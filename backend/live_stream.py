@@ -0,0 +1,296 @@
+import time
+import logging
+import threading
+import itertools
+import cv2
+from flask import request
+from frame_cache import frame_cache
+from preview_encoder import PreviewEncoder
+from metrics import metrics, stage_timer
+from flask_socketio import join_room, leave_room, emit
+
+# JPEG qualities a live viewer moves between as its connection keeps up or falls behind
+QUALITY_STEPS = (50, 35, 20)
+
+# Frame-rate bounds for live viewers
+MAX_LIVE_FPS = 30.0
+MIN_LIVE_FPS = 2.0
+
+# Unacknowledged frames allowed per viewer before it is considered backlogged
+MAX_IN_FLIGHT = 2
+
+# Seconds after which an unacknowledged frame counts as lost (a congestion signal)
+ACK_TIMEOUT = 2.0
+
+VIEWER_MODES = ('live', 'thumbnail')
+
+# Quality of the MJPEG endpoint for simple viewers
+MJPEG_QUALITY = 50
+
+# Thumbnail grid: small frames at a low, fixed rate
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_FPS = 1.5
+THUMBNAIL_QUALITY = 40
+
+
+_default_encoder = PreviewEncoder(backend="opencv", width=None)
+
+
+emitted_bytes = metrics.counter("live_stream_sent_bytes_total", "Encoded frame bytes sent to viewers", ("camera", "mode"))
+
+
+def live_room(camera_id):
+    return f"camera:{camera_id}:live"
+
+
+def thumbnail_room(camera_id):
+    return f"camera:{camera_id}:thumbnail"
+
+
+class Viewer:
+    """Send state of one live subscriber, adapted from its acknowledgements."""
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.fps = MAX_LIVE_FPS / 2
+        self.quality_step = 0
+        self.last_sent = 0.0
+        self._sent = {}  # frame number -> send time of the unacknowledged frames
+        self._numbers = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def quality(self):
+        return QUALITY_STEPS[self.quality_step]
+
+    @property
+    def in_flight(self):
+        return len(self._sent)
+
+    def backlogged(self):
+        # Multiplicative decrease: halve the rate and drop quality until the backlog clears
+        self.fps = max(MIN_LIVE_FPS, self.fps / 2)
+        self.quality_step = min(len(QUALITY_STEPS) - 1, self.quality_step + 1)
+
+    def sent(self, now):
+        """Record a frame going out; returns its number for `acked`."""
+        with self._lock:
+            number = next(self._numbers)
+            self._sent[number] = now
+        return number
+
+    def unsent(self, number):
+        with self._lock:
+            self._sent.pop(number, None)
+
+    def expire(self, now):
+        """Forget frames unacknowledged for ACK_TIMEOUT; a lost ack is treated like a backlog."""
+        with self._lock:
+            lost = [number for number, sent_at in self._sent.items() if now - sent_at >= ACK_TIMEOUT]
+            for number in lost:
+                del self._sent[number]
+        if lost:
+            self.backlogged()
+
+    def acked(self, number):
+        with self._lock:
+            if self._sent.pop(number, None) is None:
+                return  # Already expired
+            caught_up = not self._sent
+        if caught_up:
+            # Additive increase while the viewer keeps up
+            self.fps = min(MAX_LIVE_FPS, self.fps + 1)
+            if self.fps >= MAX_LIVE_FPS / 2 and self.quality_step > 0:
+                self.quality_step -= 1
+
+
+class LiveStreamHub:
+    """
+    Per-camera Socket.IO rooms for live video.
+
+    Frames are only encoded while somebody is subscribed to the camera. Live
+    viewers each get their own frame rate and JPEG quality, adapted from how
+    many frames they have not acknowledged yet. Thumbnail viewers share small,
+    low-rate frames for the dashboard wall. Frames go out as binary
+    attachments: `video_frame(camera_id, jpeg_bytes)`.
+    """
+
+    def __init__(self):
+        self.socketio = None
+        self._lock = threading.Lock()
+        self._live = {}         # camera_id -> {sid: Viewer}
+        self._thumbnails = {}   # camera_id -> set of sids
+        self._mjpeg_viewers = {}  # camera_id -> number of open MJPEG responses
+        self._last_thumbnail = {}
+
+    def init_socketio(self, socketio):
+        self.socketio = socketio
+        socketio.on_event('subscribe_camera', self._on_subscribe)
+        socketio.on_event('unsubscribe_camera', self._on_unsubscribe)
+        socketio.on_event('disconnect', self._on_disconnect)
+
+    @staticmethod
+    def _camera_id(data):
+        try:
+            return int(data.get('camera_id'))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def _on_subscribe(self, data):
+        camera_id = self._camera_id(data)
+        mode = data.get('mode', 'live') if camera_id is not None else None
+        if mode not in VIEWER_MODES:
+            emit('stream_error', {'message': 'subscribe_camera needs a numeric camera_id and mode live or thumbnail'})
+            return
+        sid = request.sid
+        self._remove(sid, camera_id)
+        self.add_viewer(camera_id, sid, mode)
+        join_room(thumbnail_room(camera_id) if mode == 'thumbnail' else live_room(camera_id))
+
+    def add_viewer(self, camera_id, sid, mode='live'):
+        """Register `sid` as a live or thumbnail viewer of the camera; joining the room is up to the caller."""
+        with self._lock:
+            if mode == 'thumbnail':
+                self._thumbnails.setdefault(camera_id, set()).add(sid)
+            else:
+                self._live.setdefault(camera_id, {})[sid] = Viewer(sid)
+
+    def _on_unsubscribe(self, data):
+        camera_id = self._camera_id(data)
+        if camera_id is None:
+            emit('stream_error', {'message': 'unsubscribe_camera needs a numeric camera_id'})
+            return
+        self._remove(request.sid, camera_id)
+
+    def _on_disconnect(self):
+        sid = request.sid
+        for camera_id in set(self._live) | set(self._thumbnails):
+            self._remove(sid, camera_id, leave=False)
+
+    def _remove(self, sid, camera_id, leave=True):
+        with self._lock:
+            if self._live.get(camera_id, {}).pop(sid, None) is not None and leave:
+                leave_room(live_room(camera_id), sid=sid)
+            thumbnails = self._thumbnails.get(camera_id)
+            if thumbnails and sid in thumbnails:
+                thumbnails.discard(sid)
+                if leave:
+                    leave_room(thumbnail_room(camera_id), sid=sid)
+
+    def has_subscribers(self, camera_id):
+        return (
+            bool(self._live.get(camera_id))
+            or bool(self._thumbnails.get(camera_id))
+            or bool(self._mjpeg_viewers.get(camera_id))
+        )
+
+    def add_mjpeg_viewer(self, camera_id):
+        with self._lock:
+            self._mjpeg_viewers[camera_id] = self._mjpeg_viewers.get(camera_id, 0) + 1
+
+    def remove_mjpeg_viewer(self, camera_id):
+        with self._lock:
+            self._mjpeg_viewers[camera_id] = max(0, self._mjpeg_viewers.get(camera_id, 0) - 1)
+
+    def mjpeg_stream(self, camera_id, sleep, boundary=b"frame"):
+        """
+        Generator of multipart/x-mixed-replace chunks for the MJPEG endpoint.
+
+        Reads the shared encoded frames from the cache; `sleep` must be
+        cooperative with the server (socketio.sleep) since it polls.
+        """
+        self.add_mjpeg_viewer(camera_id)
+        try:
+            last_seq = 0
+            while True:
+                encoded = frame_cache.latest(camera_id, ("jpeg", MJPEG_QUALITY))
+                if encoded is None or encoded.seq == last_seq:
+                    sleep(0.02)
+                    continue
+                last_seq = encoded.seq
+                yield (b"--" + boundary + b"\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                       + str(len(encoded.data)).encode() + b"\r\n\r\n")
+                yield encoded.data
+                yield b"\r\n"
+        finally:
+            self.remove_mjpeg_viewer(camera_id)
+
+    def publish(self, camera_id, frame, encoder=None):
+        """
+        Encode and send `frame` to the camera's subscribers, if it has any.
+
+        :param encoder: The camera's `PreviewEncoder`; plain OpenCV encoding when None.
+        """
+        encoder = encoder or _default_encoder
+        if self.socketio is None or not self.has_subscribers(camera_id):
+            return
+        now = time.monotonic()
+        seq = frame_cache.next_seq(camera_id)
+
+        def encode(image, quality):
+            with stage_timer("encode", camera_id):
+                return encoder.encode(image, quality)
+
+        def jpeg(quality, image=frame):
+            # Every tier is encoded at most once per frame and shared by all its viewers
+            return frame_cache.get_or_encode(
+                camera_id, ("jpeg", quality), seq,
+                lambda: encode(image, quality),
+            ).data
+
+        if self._mjpeg_viewers.get(camera_id):
+            jpeg(MJPEG_QUALITY)
+
+        if self._thumbnails.get(camera_id) and now - self._last_thumbnail.get(camera_id, 0.0) >= 1.0 / THUMBNAIL_FPS:
+            self._last_thumbnail[camera_id] = now
+
+            def thumbnail():
+                h, w = frame.shape[:2]
+                small = cv2.resize(frame, (THUMBNAIL_WIDTH, h * THUMBNAIL_WIDTH // w), interpolation=cv2.INTER_AREA)
+                return encode(small, THUMBNAIL_QUALITY)
+
+            data = frame_cache.get_or_encode(camera_id, "thumbnail", seq, thumbnail).data
+            with stage_timer("emit", camera_id):
+                self.socketio.server.emit('video_frame', (camera_id, data), to=thumbnail_room(camera_id), namespace='/')
+            emitted_bytes.inc(len(data), camera=camera_id, mode="thumbnail")
+
+        with self._lock:
+            viewers = list(self._live.get(camera_id, {}).values())
+        for viewer in viewers:
+            if now - viewer.last_sent < 1.0 / viewer.fps:
+                continue
+            viewer.expire(now)
+            if viewer.in_flight >= MAX_IN_FLIGHT:
+                viewer.backlogged()
+                continue
+            data = jpeg(viewer.quality)
+            viewer.last_sent = now
+            number = viewer.sent(now)
+            try:
+                # The client acknowledges every frame; unacknowledged frames are the send backlog
+                with stage_timer("emit", camera_id):
+                    self.socketio.server.emit(
+                        'video_frame', (camera_id, data), to=viewer.sid, namespace='/',
+                        callback=lambda *args, viewer=viewer, number=number: viewer.acked(number),
+                    )
+                emitted_bytes.inc(len(data), camera=camera_id, mode="live")
+            except Exception as e:
+                viewer.unsent(number)
+                logging.error(f"Could not send frame to {viewer.sid}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                str(camera_id): {
+                    "thumbnail_viewers": len(self._thumbnails.get(camera_id, ())),
+                    "mjpeg_viewers": self._mjpeg_viewers.get(camera_id, 0),
+                    "live_viewers": [
+                        {"fps": round(viewer.fps, 1), "quality": viewer.quality, "in_flight": viewer.in_flight}
+                        for viewer in self._live.get(camera_id, {}).values()
+                    ],
+                }
+                for camera_id in set(self._live) | set(self._thumbnails) | set(self._mjpeg_viewers)
+            }
+
+
+live_stream = LiveStreamHub()
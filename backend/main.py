@@ -14,6 +14,9 @@ http_server = None
 def signal_handler(signum, frame):
     logging.info("Signal received. Stopping the server...")
     http_server.stop()  # Stop the Gevent server
+    # Stop the inference workers and free their shared memory
+    from inference_pool import shutdown_inference_pool
+    shutdown_inference_pool()
     exit(0)  # Exit the program
 
 def initialize():
@@ -33,6 +36,19 @@ def initialize():
             db.session.add(new_user)
             db.session.commit()
 
+    # Load the models and the face embedding index in the background so the API can start serving;
+    # /api/health reports when they are ready
+    from face_recognition import start_warm_up
+    start_warm_up()
+
+    # Resume transcode/upload jobs left over from the previous run
+    from storage import job_queue, bucket
+    job_queue.start()
+
+    # Keep the recordings table in sync with the bucket
+    from recordings_index import start_reconciliation
+    start_reconciliation(bucket)
+
     # Register the signal handler for SIGINT (Ctrl+C)
     signal.signal(signal.SIGINT, signal_handler)
 
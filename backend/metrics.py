@@ -0,0 +1,231 @@
+import os
+import time
+import bisect
+import random
+import logging
+import threading
+
+# Turn the whole instrumentation layer off; timers become no-ops
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Fraction of per-frame stage timings that are recorded. Counters always count;
+# at 0.1 the timers stay well under 1% of the frame time
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", 0.1))
+
+# Per-frame debug output (recognised faces, stream reader logs); keep off in production
+FRAME_DEBUG_LOGGING = os.getenv("FRAME_DEBUG_LOGGING", "0") == "1"
+
+# Bearer token required by /metrics; without one, /metrics only answers requests from this machine
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LOG_LEVEL = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+
+# Seconds; spans a fast JPEG encode up to a multi-minute upload
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 120.0)
+
+
+def _format_labels(label_names, values, extra=()):
+    pairs = list(zip(label_names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms rendered in the Prometheus text format.
+
+    Metrics updated in the hot path live here directly. Everything that
+    already keeps its own `stats()` is read at scrape time by a collector
+    instead, so serving /metrics adds nothing to frame processing.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, label_names, **kwargs)
+            return metric
+
+    def counter(self, name, help, label_names=()):
+        return self._get_or_create(Counter, name, help, label_names)
+
+    def gauge(self, name, help, label_names=()):
+        return self._get_or_create(Gauge, name, help, label_names)
+
+    def histogram(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help, label_names, buckets=buckets)
+
+    def register_collector(self, collect):
+        """
+        :param collect: Callable returning (name, help, {label: value}, value) gauge samples, read on every scrape.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        collected = {}
+        for collect in self._collectors:
+            try:
+                for name, help, labels, value in collect():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    if isinstance(value, (int, float)):
+                        collected.setdefault(name, (help, []))[1].append((labels, value))
+            except Exception as e:
+                logging.error(f"Metrics collector failed: {e}")
+        for name, (help, samples) in collected.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.histogram(
+    "camera_stage_seconds", "Time spent per frame in each processing stage (sampled)", ("camera", "stage")
+)
+stage_total = metrics.counter("camera_stage_total", "Frames through each processing stage", ("camera", "stage"))
+
+
+class _StageTimer:
+    __slots__ = ("stage", "camera", "start")
+
+    def __init__(self, stage, camera, sampled):
+        self.stage = stage
+        self.camera = camera
+        self.start = time.perf_counter() if sampled else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        stage_total.inc(camera=self.camera, stage=self.stage)
+        if self.start is not None:
+            stage_seconds.observe(time.perf_counter() - self.start, camera=self.camera, stage=self.stage)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+def stage_timer(stage, camera_id=None, always=False):
+    """
+    Context manager counting one pass through `stage` and timing a sample of them.
+
+    :param always: Time every pass; for rare stages such as uploads where sampling would lose them.
+    """
+    if not METRICS_ENABLED:
+        return _null_timer
+    return _StageTimer(stage, "" if camera_id is None else camera_id, always or random.random() < METRICS_SAMPLE_RATE)
+
+
+def observe_stage(stage, camera_id, seconds):
+    """Record a stage duration that the caller has already measured."""
+    if not METRICS_ENABLED:
+        return
+    camera = "" if camera_id is None else camera_id
+    stage_total.inc(camera=camera, stage=stage)
+    if random.random() < METRICS_SAMPLE_RATE:
+        stage_seconds.observe(seconds, camera=camera, stage=stage)
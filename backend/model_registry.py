@@ -0,0 +1,258 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+
+# OpenCV DNN SSD face detector (ResNet-10, 300x300), the CPU alternative to RetinaFace
+DETECTOR_PROTOTXT = os.getenv("DETECTOR_PROTOTXT", "deploy.prototxt")
+DETECTOR_CAFFEMODEL = os.getenv("DETECTOR_CAFFEMODEL", "res10_300x300_ssd_iter_140000.caffemodel")
+
+# ONNX exports of the recognition models, named <model_name>.onnx
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models")
+
+# Precision of the ONNX embedding model: fp32, or the fp16/int8 variants written by `quantization`
+EMBEDDING_PRECISION = os.getenv("EMBEDDING_PRECISION", "fp32")
+
+# ONNX Runtime session settings; 0 threads lets ONNX Runtime pick from the core count
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", 0))
+ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", 0))
+ONNX_GRAPH_OPTIMIZATION = os.getenv("ONNX_GRAPH_OPTIMIZATION", "all")  # disabled, basic, extended or all
+
+# Seconds before a model that failed to load is tried again; until then `get` fails fast
+MODEL_RETRY_BACKOFF = float(os.getenv("MODEL_RETRY_BACKOFF", 60))
+
+# Model states reported by /api/health
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelEntry:
+    def __init__(self, loader, warm_up=None):
+        self.loader = loader
+        self.warm_up = warm_up
+        self.model = None
+        self.state = NOT_LOADED
+        self.error = None
+        self.failed_at = None
+        self.load_seconds = None
+        self.warm_up_seconds = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Loads heavy models on first use instead of at import time.
+
+    TensorFlow, DeepFace, RetinaFace and ONNX Runtime are only imported by the loaders
+    registered here, so the web tier can import every module and start
+    serving before any ML stack is loaded. `start_warm_up` loads the models
+    in the background and runs a dummy inference through each one, so the
+    first real frame doesn't pay for graph building.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, warm_up=None):
+        """
+        :param loader: Callable returning the loaded model.
+        :param warm_up: Optional callable taking the model and running a dummy inference.
+        """
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = ModelEntry(loader, warm_up)
+
+    @staticmethod
+    def _check_backoff(name, entry):
+        if entry.state == FAILED and time.monotonic() - entry.failed_at < MODEL_RETRY_BACKOFF:
+            raise RuntimeError(f"Model {name} failed to load: {entry.error}")
+
+    def get(self, name):
+        """
+        Return the model, loading it on the calling thread if nobody has yet.
+
+        :raises RuntimeError: The model failed to load less than MODEL_RETRY_BACKOFF seconds ago.
+        """
+        entry = self._entries[name]
+        if entry.state == READY:
+            return entry.model
+        # A missing model file would otherwise be reloaded (and fail) on every frame of every camera
+        self._check_backoff(name, entry)
+        with entry.lock:
+            if entry.state != READY:
+                self._check_backoff(name, entry)
+                entry.state = LOADING
+                start = time.perf_counter()
+                try:
+                    entry.model = entry.loader()
+                except Exception as e:
+                    entry.state = FAILED
+                    entry.error = repr(e)
+                    entry.failed_at = time.monotonic()
+                    raise
+                entry.load_seconds = round(time.perf_counter() - start, 3)
+                entry.error = None
+                entry.state = READY
+                logging.info(f"Model {name} loaded in {entry.load_seconds}s.")
+        return entry.model
+
+    def warm_up(self, names=None):
+        """Load `names` (default: all registered models) and run their warm-up inference."""
+        for name in names or list(self._entries):
+            entry = self._entries[name]
+            try:
+                model = self.get(name)
+                if entry.warm_up is not None and entry.warm_up_seconds is None:
+                    start = time.perf_counter()
+                    entry.warm_up(model)
+                    entry.warm_up_seconds = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                logging.error(f"Warm-up of model {name} failed: {e}")
+
+    def start_warm_up(self, names=None, then=None):
+        """Run `warm_up` on a background thread, followed by `then` if given."""
+        def run():
+            self.warm_up(names)
+            if then is not None:
+                then()
+
+        thread = threading.Thread(target=run, name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def ready(self, names=None):
+        entries = [self._entries[name] for name in names] if names else self._entries.values()
+        return all(entry.state == READY for entry in entries)
+
+    def failed(self, names=None):
+        entries = [self._entries[name] for name in names] if names else self._entries.values()
+        return any(entry.state == FAILED for entry in entries)
+
+    def status(self):
+        with self._lock:
+            entries = list(self._entries.items())
+        return {
+            name: {
+                "state": entry.state,
+                "load_seconds": entry.load_seconds,
+                "warm_up_seconds": entry.warm_up_seconds,
+                "error": entry.error,
+            }
+            for name, entry in entries
+        }
+
+
+model_registry = ModelRegistry()
+
+
+def _load_tensorflow():
+    # Set the GPU allocator to enable asynchronous memory allocation
+    os.environ.setdefault('TF_GPU_ALLOCATOR', 'cuda_malloc_async')
+    import tensorflow as tf
+
+    gpus = tf.config.list_physical_devices('GPU')
+    if gpus:
+        try:
+            for gpu in gpus:
+                tf.config.experimental.set_memory_growth(gpu, True)
+            print("TensorFlow GPU ready.")
+        except RuntimeError as e:
+            print(f"TensorFlow error: {e}")
+    return tf
+
+
+def _load_retinaface():
+    model_registry.get("tensorflow")
+    from retinaface import RetinaFace
+    RetinaFace.build_model()
+    return RetinaFace
+
+
+def _warm_up_retinaface(retinaface):
+    retinaface.detect_faces(np.zeros((240, 320, 3), dtype=np.uint8))
+
+
+model_registry.register("tensorflow", _load_tensorflow)
+model_registry.register("retinaface", _load_retinaface, _warm_up_retinaface)
+
+
+def deepface_model(model_name):
+    """Register the DeepFace recognition model `model_name` and return its registry name."""
+    def load():
+        model_registry.get("tensorflow")
+        from deepface import DeepFace
+        return DeepFace.build_model(model_name)
+
+    def warm_up(model):
+        width, height = tuple(model.input_shape)
+        model.model(np.zeros((1, height, width, 3), dtype=np.float32), training=False)
+
+    name = f"deepface:{model_name}"
+    model_registry.register(name, load, warm_up)
+    return name
+
+
+def _load_opencv_ssd():
+    import cv2
+    net = cv2.dnn.readNetFromCaffe(DETECTOR_PROTOTXT, DETECTOR_CAFFEMODEL)
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    return net
+
+
+def _warm_up_opencv_ssd(net):
+    net.setInput(np.zeros((1, 3, 300, 300), dtype=np.float32))
+    net.forward()
+
+
+model_registry.register("opencv_ssd", _load_opencv_ssd, _warm_up_opencv_ssd)
+
+
+def onnx_model_path(model_name, precision=None):
+    precision = precision or EMBEDDING_PRECISION
+    suffix = "" if precision == "fp32" else f".{precision}"
+    return os.path.join(ONNX_MODEL_DIR, f"{model_name}{suffix}.onnx")
+
+
+def onnx_model(model_name, precision=None):
+    """Register the ONNX Runtime session for `model_name` at `precision` and return its registry name."""
+    precision = precision or EMBEDDING_PRECISION
+    def load():
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        options.inter_op_num_threads = ONNX_INTER_OP_THREADS
+        options.graph_optimization_level = {
+            "disabled": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[ONNX_GRAPH_OPTIMIZATION]
+        path = onnx_model_path(model_name, precision)
+        return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    def warm_up(session):
+        model_input = session.get_inputs()[0]
+        _, height, width, channels = model_input.shape
+        session.run(None, {model_input.name: np.zeros((1, height, width, channels), dtype=np.float32)})
+
+    name = f"onnx:{model_name}" if precision == "fp32" else f"onnx:{model_name}:{precision}"
+    model_registry.register(name, load, warm_up)
+    return name
+
+
+def get_retinaface():
+    return model_registry.get("retinaface")
+
+
+def get_deepface_model(model_name):
+    return model_registry.get(deepface_model(model_name))
+
+
+def get_onnx_session(model_name, precision=None):
+    return model_registry.get(onnx_model(model_name, precision))
@@ -40,4 +40,32 @@ class Camera(db.Model):
     def __init__(self, name, rtsp_url, is_active=True):
         self.name = name
         self.rtsp_url = rtsp_url
-        self.is_active = is_active
\ No newline at end of file
+        self.is_active = is_active
+
+class Recording(db.Model):
+    __tablename__ = 'recordings'
+    __table_args__ = (
+        db.Index('ix_recordings_camera_started', 'camera_id', 'started_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    camera_id = db.Column(db.Integer, nullable=True)
+    blob_name = db.Column(db.String(255), unique=True, nullable=False)
+    url = db.Column(db.String(512), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    ended_at = db.Column(db.DateTime, nullable=True)
+    duration = db.Column(db.Float, nullable=True)  # Seconds
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+    identities = db.Column(db.Text, nullable=True)  # Comma-separated names seen during the recording
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "camera_id": self.camera_id,
+            "url": self.url,
+            "date": self.started_at.isoformat(),
+            "ended_at": self.ended_at.isoformat() if self.ended_at else None,
+            "duration": self.duration,
+            "size_bytes": self.size_bytes,
+            "identities": self.identities.split(",") if self.identities else [],
+        }
@@ -0,0 +1,72 @@
+import time
+import cv2
+
+# Width of the grayscale copy used for motion detection
+MOTION_FRAME_WIDTH = 160
+
+
+class MotionGate:
+    """
+    Cheap pre-filter that decides whether a frame is worth running face detection on.
+
+    Keeps a running-average background of a small blurred grayscale copy of the
+    frame and reports motion when enough pixels of the region of interest differ
+    from it.
+    """
+
+    def __init__(self, sensitivity=0.01, threshold=25, roi=None, force_interval=5.0, learning_rate=0.05):
+        self.sensitivity = sensitivity
+        self.threshold = threshold
+        self.roi = roi
+        self.force_interval = force_interval
+        self.learning_rate = learning_rate
+        self.background = None
+        self.last_processed = 0.0
+        self.gated = 0
+        self.processed = 0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (MOTION_FRAME_WIDTH, max(1, h * MOTION_FRAME_WIDTH // w)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        if self.roi:
+            rx, ry, rw, rh = self.roi
+            gh, gw = gray.shape
+            gray = gray[int(ry * gh):int((ry + rh) * gh), int(rx * gw):int((rx + rw) * gw)]
+        return gray
+
+    def has_motion(self, frame):
+        gray = self._small_gray(frame)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype("float32")
+            return True
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+        changed = cv2.countNonZero(cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)[1])
+        return changed >= self.sensitivity * diff.size
+
+    def should_process(self, frame, active_tracks=False):
+        """
+        Whether the heavy detection stage should run for `frame`.
+
+        Detection keeps running while faces are being tracked, so a person standing
+        still is not dropped, and at least every `force_interval` seconds.
+        """
+        now = time.monotonic()
+        motion = self.has_motion(frame)
+        if motion or active_tracks or now - self.last_processed >= self.force_interval:
+            self.last_processed = now
+            self.processed += 1
+            return True
+        self.gated += 1
+        return False
+
+    def stats(self):
+        total = self.gated + self.processed
+        return {
+            "gated": self.gated,
+            "processed": self.processed,
+            "gated_ratio": round(self.gated / total, 3) if total else 0.0,
+        }
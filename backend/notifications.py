@@ -1,28 +1,300 @@
-import boto3
 import os
+import sys
+import json
+import time
+import queue
+import smtplib
+import logging
+import threading
+from collections import deque
+from email.message import EmailMessage
+import requests
 from dotenv import load_dotenv
 from datetime import datetime
 
 load_dotenv()
 
-# Initialize the Boto3 SNS client
-sns_client = boto3.client(
-    'sns',
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
-    region_name=os.getenv("AWS_REGION")  # e.g., 'us-west-2'
-)
-
 SNS_TOPIC_ARN = os.getenv("SNS_TOPIC_ARN")  # Add your SNS topic ARN here
 
+# Comma-separated transports to deliver through: sns, smtp, webhook, stub
+NOTIFICATION_TRANSPORTS = os.getenv("NOTIFICATION_TRANSPORTS", "sns")
+
+# Messages sent together at most, and how long to wait to fill a batch (seconds)
+NOTIFICATION_BATCH_SIZE = 10
+NOTIFICATION_BATCH_WINDOW = 1.0
+
+# At most this many batches per minute, per dispatcher
+NOTIFICATION_RATE_PER_MINUTE = int(os.getenv("NOTIFICATION_RATE_PER_MINUTE", 30))
+
+NOTIFICATION_MAX_ATTEMPTS = 5
+
+SUBJECT = "Alert: Unknown Face Detected"
+
+SMTP_SECURITY_MODES = ("starttls", "ssl", "none")
+
+
+class SNSTransport:
+    """Amazon SNS, reusing one boto3 client and publishing batches in one call."""
+
+    def __init__(self, topic_arn=SNS_TOPIC_ARN):
+        import boto3
+
+        self.topic_arn = topic_arn
+        # Initialize the Boto3 SNS client
+        self.client = boto3.client(
+            'sns',
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
+            region_name=os.getenv("AWS_REGION")  # e.g., 'us-west-2'
+        )
+
+    def send(self, messages):
+        if len(messages) == 1:
+            self.client.publish(TopicArn=self.topic_arn, Message=messages[0], Subject=SUBJECT)
+            return
+        response = self.client.publish_batch(
+            TopicArn=self.topic_arn,
+            PublishBatchRequestEntries=[
+                {"Id": str(i), "Message": message, "Subject": SUBJECT} for i, message in enumerate(messages)
+            ],
+        )
+        if response.get("Failed"):
+            raise RuntimeError(f"SNS rejected {len(response['Failed'])} message(s): {response['Failed']}")
+
+
+class SMTPTransport:
+    """E-mail through one kept-open SMTP connection; a batch becomes a single message."""
+
+    def __init__(self):
+        self.host = os.getenv("SMTP_HOST", "localhost")
+        # starttls upgrades a plain connection (port 587), ssl is implicit TLS (SMTPS, port 465)
+        self.security = os.getenv("SMTP_SECURITY", "starttls")
+        if self.security not in SMTP_SECURITY_MODES:
+            raise ValueError(f"SMTP_SECURITY must be one of {', '.join(SMTP_SECURITY_MODES)}, not {self.security!r}")
+        self.port = int(os.getenv("SMTP_PORT", 465 if self.security == "ssl" else 587))
+        self.username = os.getenv("SMTP_USERNAME")
+        self.password = os.getenv("SMTP_PASSWORD")
+        self.sender = os.getenv("SMTP_FROM", "alerts@localhost")
+        self.recipients = [r for r in os.getenv("SMTP_TO", "").split(",") if r]
+        self._connection = None
+
+    def _connect(self):
+        if self.security == "ssl":
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=10)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=10)
+            if self.security == "starttls":
+                connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def send(self, messages):
+        email = EmailMessage()
+        email["Subject"] = SUBJECT
+        email["From"] = self.sender
+        email["To"] = ", ".join(self.recipients)
+        email.set_content("\n".join(messages))
+        try:
+            if self._connection is None:
+                self._connection = self._connect()
+            self._connection.send_message(email)
+        except Exception:
+            # Drop the connection so the retry reconnects
+            self._connection = None
+            raise
+
+
+class WebhookTransport:
+    """HTTP POST of the batch as JSON over a pooled session."""
+
+    def __init__(self):
+        self.url = os.getenv("NOTIFICATION_WEBHOOK_URL")
+        self.session = requests.Session()
+
+    def send(self, messages):
+        response = self.session.post(self.url, json={"subject": SUBJECT, "messages": messages}, timeout=10)
+        response.raise_for_status()
+
+
+class StubTransport:
+    """Local stand-in for load tests: appends JSON lines to a file, or stdout."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("NOTIFICATION_STUB_PATH")
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        line = json.dumps({"time": time.time(), "subject": SUBJECT, "messages": messages})
+        with self._lock:
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+            else:
+                sys.stdout.write(line + "\n")
+
+
+TRANSPORTS = {
+    "sns": SNSTransport,
+    "smtp": SMTPTransport,
+    "webhook": WebhookTransport,
+    "stub": StubTransport,
+}
+
+
+class NotificationDispatcher:
+    """
+    Delivers notifications from an in-process queue so callers never wait on the network.
+
+    The worker batches messages that arrive within `batch_window`, keeps the
+    send rate under `rate_per_minute` batches, and retries failed batches
+    with exponential backoff without holding up newer messages.
+
+    :param transports: Objects with a `send(messages)` method; all of them receive every batch.
+    """
+
+    def __init__(self, transports, batch_size=NOTIFICATION_BATCH_SIZE, batch_window=NOTIFICATION_BATCH_WINDOW,
+                 rate_per_minute=NOTIFICATION_RATE_PER_MINUTE, max_attempts=NOTIFICATION_MAX_ATTEMPTS):
+        self.transports = transports
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.min_interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue()
+        self._retries = []  # (due time, attempts, [(enqueued_at, message)], transports still to deliver to)
+        self._last_send = 0.0
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._lock = threading.Lock()  # guards _retries and _latencies, which stats() reads from other threads
+        self._latencies = deque(maxlen=500)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self):
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="notifications", daemon=True)
+                self._worker.start()
+        return self
+
+    def enqueue(self, message):
+        self.start()
+        self._queue.put((time.time(), message))
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            now = time.time()
+            with self._lock:
+                due = [retry for retry in self._retries if retry[0] <= now]
+                retry = min(due, key=lambda retry: retry[0]) if due else None
+                if retry is not None:
+                    self._retries.remove(retry)
+            if retry is not None:
+                self._deliver(retry[2], retry[1], retry[3])
+                continue
+            batch = self._collect()
+            if batch:
+                self._deliver(batch, 0)
+
+    def _deliver(self, batch, attempts, transports=None):
+        """
+        :param transports: Transports that have not delivered the batch yet; all of them on the first attempt.
+        """
+        # Rate limit: space batches at least min_interval apart
+        wait = self._last_send + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_send = time.monotonic()
+
+        messages = [message for _, message in batch]
+        failed = []
+        errors = []
+        for transport in transports or self.transports:
+            try:
+                transport.send(messages)
+            except Exception as e:
+                failed.append(transport)
+                errors.append(f"{type(transport).__name__}: {e}")
+
+        if failed:
+            # Only the failing transports retry, so the others don't send duplicates
+            attempts += 1
+            error = "; ".join(errors)
+            if attempts >= self.max_attempts:
+                self.failed += len(batch)
+                logging.error(f"Dropping {len(batch)} notification(s) after {attempts} attempts: {error}")
+            else:
+                self.retried += 1
+                delay = 2 ** attempts
+                logging.warning(f"Notification delivery failed ({error}); retrying in {delay}s")
+                with self._lock:
+                    self._retries.append((time.time() + delay, attempts, batch, failed))
+            return
+
+        delivered = time.time()
+        self.sent += len(batch)
+        with self._lock:
+            self._latencies.extend(delivered - enqueued for enqueued, _ in batch)
+        logging.info(f"Notification sent: {len(batch)} message(s)")
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            retrying = sum(len(retry[2]) for retry in self._retries)
+        latencies.sort()
+        return {
+            "queued": self._queue.qsize(),
+            "retrying": retrying,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried_batches": self.retried,
+            "latency_avg_s": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "latency_p95_s": round(latencies[int(0.95 * (len(latencies) - 1))], 3) if latencies else None,
+        }
+
+
+def create_dispatcher(names=NOTIFICATION_TRANSPORTS):
+    return NotificationDispatcher([TRANSPORTS[name.strip()]() for name in names.split(",") if name.strip()])
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = create_dispatcher()
+    return _dispatcher
+
+
 def send_notification(url):
     now = datetime.now()
     formatted_now = now.strftime("%d/%m/%y %H:%M:%S")
     message = f"Unknown face detected @{formatted_now} - {url}"
 
-    response = sns_client.publish(
-        TopicArn=SNS_TOPIC_ARN,
-        Message=message,
-        Subject="Alert: Unknown Face Detected"
-    )
-    print("Notification sent:", response)
+    # Delivery happens on the dispatcher's worker; this returns immediately
+    get_dispatcher().enqueue(message)
+
+
+def notification_stats():
+    return _dispatcher.stats() if _dispatcher is not None else {"sent": 0, "queued": 0}
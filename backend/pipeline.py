@@ -0,0 +1,178 @@
+import time
+import logging
+import threading
+from collections import deque
+from metrics import observe_stage
+
+
+class LatestFrameQueue:
+    """
+    Bounded queue between two pipeline stages that never blocks the producer.
+
+    When the queue is full the oldest item is dropped, so a slow consumer always
+    gets the most recent frame instead of working through a backlog of stale ones.
+    With `maxsize=1` this is a single "latest frame wins" slot.
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest queued item, or None if nothing arrived within `timeout` or the queue was closed."""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StageStats:
+    """Throughput and processing time of one pipeline stage."""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self.frames = 0
+        self.fps = 0.0
+        self.last_ms = 0.0
+        self._window_start = time.monotonic()
+        self._window_frames = 0
+
+    def record(self, elapsed):
+        self.frames += 1
+        self.last_ms = elapsed * 1000
+        self._window_frames += 1
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self.fps = self._window_frames / (now - self._window_start)
+            self._window_start = now
+            self._window_frames = 0
+
+    def as_dict(self):
+        return {"frames": self.frames, "fps": round(self.fps, 2), "last_ms": round(self.last_ms, 2)}
+
+
+class CameraPipeline:
+    """
+    Per-camera capture -> inference -> publish pipeline.
+
+    Each stage runs on its own thread and hands its output to the next stage
+    through a `LatestFrameQueue`, so a slow inference or publish step drops
+    stale frames instead of slowing down capture.
+
+    :param read_frame: Returns the next frame, or None when the stream should stop.
+    :param infer: Takes a frame and returns the item to publish (or None to skip it).
+    :param publish: Sends an inferred item to the clients.
+    :param queue_size: Capacity of the queues between stages.
+    """
+
+    def __init__(self, camera_id, read_frame, infer, publish, queue_size=1):
+        self.camera_id = camera_id
+        self.read_frame = read_frame
+        self.infer = infer
+        self.publish = publish
+        self.inference_queue = LatestFrameQueue(queue_size)
+        self.publish_queue = LatestFrameQueue(queue_size)
+        self.stats = {"capture": StageStats(), "inference": StageStats(), "publish": StageStats()}
+        self._running = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def start(self):
+        self._running.set()
+        for name, target in (("capture", self._capture), ("inference", self._inference), ("publish", self._publish)):
+            thread = threading.Thread(target=target, name=f"camera-{self.camera_id}-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._running.clear()
+        self.inference_queue.close()
+        self.publish_queue.close()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _capture(self):
+        try:
+            while self.running:
+                start = time.monotonic()
+                frame = self.read_frame()
+                if frame is None:
+                    break
+                self.inference_queue.put(frame)
+                self._record("capture", time.monotonic() - start)
+        except Exception as e:
+            logging.error(f"Capture error for camera {self.camera_id}: {e}")
+        finally:
+            self.stop()
+
+    def _inference(self):
+        while self.running:
+            frame = self.inference_queue.get(timeout=1.0)
+            if frame is None:
+                continue
+            start = time.monotonic()
+            try:
+                item = self.infer(frame)
+            except Exception as e:
+                logging.error(f"Inference error for camera {self.camera_id}: {e}")
+                continue
+            if item is not None:
+                self.publish_queue.put(item)
+            self._record("inference", time.monotonic() - start)
+
+    def _publish(self):
+        while self.running:
+            item = self.publish_queue.get(timeout=1.0)
+            if item is None:
+                continue
+            start = time.monotonic()
+            try:
+                self.publish(item)
+            except Exception as e:
+                logging.error(f"Publish error for camera {self.camera_id}: {e}")
+                continue
+            self._record("publish", time.monotonic() - start)
+
+    def _record(self, stage, elapsed):
+        self.stats[stage].record(elapsed)
+        observe_stage(stage, self.camera_id, elapsed)
+
+    def get_stats(self):
+        stats = {name: stage.as_dict() for name, stage in self.stats.items()}
+        stats["inference"].update(queue_depth=len(self.inference_queue), dropped=self.inference_queue.dropped)
+        stats["publish"].update(queue_depth=len(self.publish_queue), dropped=self.publish_queue.dropped)
+        return stats
+
+
+# Running pipelines, keyed by camera id
+camera_pipelines = {}
+
+
+def pipeline_stats():
+    """Per-stage FPS, timing and queue metrics for every running camera."""
+    return {str(camera_id): pipeline.get_stats() for camera_id, pipeline in camera_pipelines.items()}
@@ -0,0 +1,111 @@
+import time
+import cv2
+import numpy as np
+
+
+class PrerollBuffer:
+    """
+    Ring buffer of the last few seconds of a camera, kept as JPEG bytes.
+
+    Frames are sampled at the recording frame rate and compressed, so each
+    camera only holds a bounded amount of memory. When a recording starts the
+    buffered frames are written first, so the footage includes the moments
+    before the event was confirmed.
+
+    The encoded frames are copied into one byte ring allocated up front, with
+    their timestamps and positions in fixed arrays, so pushing a frame does
+    not allocate per-frame containers; only OpenCV's encode output is temporary.
+
+    :param seconds: How much history to keep.
+    :param max_bytes: Memory cap for the encoded frames; oldest frames are dropped first.
+    :param fps: Sampling rate, normally the frame rate of the recording writer.
+    :param quality: JPEG quality of the buffered frames.
+    """
+
+    def __init__(self, seconds=5.0, max_bytes=8 * 1024 * 1024, fps=20.0, quality=80):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.interval = 1.0 / fps
+        self.quality = quality
+        self._encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        self._data = np.empty(max_bytes, dtype=np.uint8)
+        capacity = int(seconds * fps) + 2
+        self._times = np.zeros(capacity)
+        self._starts = np.zeros(capacity, dtype=np.int64)
+        self._lengths = np.zeros(capacity, dtype=np.int64)
+        self._first = 0      # slot of the oldest frame
+        self._count = 0
+        self._bytes = 0
+        self._write_pos = 0  # where the next frame's bytes go
+        self._last_push = 0.0
+
+    def _drop_oldest(self):
+        self._bytes -= int(self._lengths[self._first])
+        self._first = (self._first + 1) % len(self._times)
+        self._count -= 1
+
+    def _oldest_overlaps(self, start, end):
+        oldest = self._first
+        return self._starts[oldest] < end and self._starts[oldest] + self._lengths[oldest] > start
+
+    def push(self, frame, now=None):
+        now = time.monotonic() if now is None else now
+        if now - self._last_push < self.interval:
+            return
+        self._last_push = now
+
+        ok, buffer = cv2.imencode('.jpg', frame, self._encode_params)
+        size = len(buffer)
+        if not ok or size > self.max_bytes:
+            return
+
+        while self._count and now - self._times[self._first] > self.seconds:
+            self._drop_oldest()
+
+        start = self._write_pos
+        if start + size > self.max_bytes:
+            # Wrap around; everything still stored behind the write position is older than what's in front
+            while self._count and self._starts[self._first] >= self._write_pos:
+                self._drop_oldest()
+            start = 0
+        # Free the bytes the frame lands on, and a slot
+        while self._count and (self._count == len(self._times) or self._oldest_overlaps(start, start + size)):
+            self._drop_oldest()
+
+        self._data[start:start + size] = buffer.ravel()
+        slot = (self._first + self._count) % len(self._times)
+        self._times[slot] = now
+        self._starts[slot] = start
+        self._lengths[slot] = size
+        self._count += 1
+        self._bytes += size
+        self._write_pos = start + size
+
+    def flush(self, writer, frame_size):
+        """Decode the buffered frames into `writer` (oldest first) and empty the buffer."""
+        width, height = frame_size
+        resized = None
+        for i in range(self._count):
+            slot = (self._first + i) % len(self._times)
+            start = int(self._starts[slot])
+            frame = cv2.imdecode(self._data[start:start + int(self._lengths[slot])], cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            if frame.shape[1] != width or frame.shape[0] != height:
+                resized = cv2.resize(frame, (width, height), dst=resized)
+                frame = resized
+            writer.write(frame)
+        self.clear()
+
+    def clear(self):
+        self._first = 0
+        self._count = 0
+        self._bytes = 0
+        self._write_pos = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self):
+        return self._bytes
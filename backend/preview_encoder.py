@@ -0,0 +1,71 @@
+import cv2
+
+try:
+    import simplejpeg  # libjpeg-turbo bindings
+except ImportError:
+    simplejpeg = None
+
+ENCODER_BACKENDS = ("opencv", "simplejpeg")
+
+# OpenCV flag values for the chroma subsampling settings (OpenCV >= 4.5.5)
+_OPENCV_SUBSAMPLING = {
+    "444": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_444", None),
+    "422": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_422", None),
+    "420": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_420", None),
+}
+
+
+class PreviewEncoder:
+    """
+    Encodes live-preview frames: optional downscale to the preview width, then JPEG.
+
+    :param backend: "simplejpeg" (libjpeg-turbo) or "opencv"; falls back to OpenCV if simplejpeg is missing.
+    :param width: Preview width in pixels; frames wider than this are resized first. None keeps the full resolution.
+    :param subsampling: Chroma subsampling, "444", "422" or "420".
+    :param fast_dct: Use libjpeg-turbo's faster, slightly less accurate DCT (simplejpeg only).
+    """
+
+    def __init__(self, backend="simplejpeg", width=960, subsampling="420", fast_dct=True):
+        if backend not in ENCODER_BACKENDS:
+            raise ValueError(f"Unknown preview encoder backend: {backend}")
+        if backend == "simplejpeg" and simplejpeg is None:
+            backend = "opencv"
+        self.backend = backend
+        self.width = width
+        self.subsampling = subsampling
+        self.fast_dct = fast_dct
+
+    def prepare(self, frame):
+        """
+        Resize `frame` to the preview width.
+
+        :return: (preview, scale) where scale maps full-resolution coordinates onto the preview.
+        """
+        h, w = frame.shape[:2]
+        if not self.width or w <= self.width:
+            return frame, 1.0
+        scale = self.width / w
+        return cv2.resize(frame, (self.width, int(h * scale)), interpolation=cv2.INTER_AREA), scale
+
+    def encode(self, image, quality):
+        if self.backend == "simplejpeg":
+            if not image.flags['C_CONTIGUOUS']:
+                image = image.copy()
+            return simplejpeg.encode_jpeg(
+                image, quality=quality, colorspace='BGR', colorsubsampling=self.subsampling, fastdct=self.fast_dct
+            )
+
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        sampling = _OPENCV_SUBSAMPLING.get(self.subsampling)
+        if sampling is not None:
+            params += [int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR), int(sampling)]
+        return cv2.imencode('.jpg', image, params)[1].tobytes()
+
+
+def create_preview_encoder(settings):
+    """Build the encoder described by a camera's settings (see camera_settings.py)."""
+    return PreviewEncoder(
+        backend=settings["preview_encoder"],
+        width=settings["preview_width"],
+        subsampling=settings["preview_subsampling"],
+    )
@@ -0,0 +1,161 @@
+"""
+Reduced-precision variants of the ONNX embedding model.
+
+    python -m quantization --precision int8 --dataset dataset --calibration-images 300
+    python -m quantization --precision fp16
+
+Both read `<ONNX_MODEL_DIR>/<model>.onnx` (see `embedding_index.export_onnx_model`)
+and write `<model>.<precision>.onnx` next to it, which the "onnx" embedding
+backend loads when EMBEDDING_PRECISION is set to that precision.
+"""
+import os
+import argparse
+import itertools
+import cv2
+import numpy as np
+from model_registry import onnx_model_path
+from embedding_index import list_dataset_images, preprocess_face, get_input_size
+from dataset import capture_index, image_number
+
+PRECISIONS = ("fp32", "fp16", "int8")
+
+
+def dataset_captures(dataset_path):
+    """
+    Dataset images grouped by the capture they were augmented from.
+
+    :return: (person, [img_path, ...]) per capture, interleaved across people in capture order,
+        with each capture's original image first.
+    """
+    by_person = {}
+    for person, img_path in list_dataset_images(dataset_path):
+        by_person.setdefault(person, {}).setdefault(capture_index(img_path), []).append(img_path)
+
+    per_person = [
+        [(person, sorted(captures[key], key=lambda path: image_number(path) or 0)) for key in sorted(captures)]
+        for person, captures in by_person.items()
+    ]
+    # Taking people in turn keeps any prefix from being dominated by whoever has the most images
+    return [capture for group in itertools.zip_longest(*per_person) for capture in group if capture]
+
+
+def split_captures(dataset_path, calibration_limit):
+    """
+    Split the dataset by capture into calibration and held-out evaluation sets.
+
+    Whole captures go to one side, so no augmented copy of a calibration image is evaluated.
+
+    :return: (calibration captures, evaluation captures), both as returned by `dataset_captures`.
+    """
+    calibration, evaluation = [], []
+    count = 0
+    for person, img_paths in dataset_captures(dataset_path):
+        if count < calibration_limit:
+            calibration.append((person, img_paths))
+            count += len(img_paths)
+        else:
+            evaluation.append((person, img_paths))
+    return calibration, evaluation
+
+
+def calibration_images(dataset_path, limit):
+    """Up to `limit` dataset images from whole captures, interleaved across people."""
+    calibration, _ = split_captures(dataset_path, limit)
+    return [img_path for _, img_paths in calibration for img_path in img_paths][:limit]
+
+
+class DatasetCalibrationReader:
+    """Feeds preprocessed dataset faces to ONNX Runtime's static quantisation calibrator."""
+
+    def __init__(self, img_paths, input_name, target_size, batch_size=16):
+        self.img_paths = img_paths
+        self.input_name = input_name
+        self.target_size = target_size
+        self.batch_size = batch_size
+        self._batches = None
+
+    def _load(self):
+        for start in range(0, len(self.img_paths), self.batch_size):
+            tensors = []
+            for img_path in self.img_paths[start:start + self.batch_size]:
+                image = cv2.imread(img_path)
+                if image is not None:
+                    tensors.append(preprocess_face(image, self.target_size))
+            if tensors:
+                yield {self.input_name: np.stack(tensors)}
+
+    def get_next(self):
+        if self._batches is None:
+            self._batches = self._load()
+        return next(self._batches, None)
+
+    def rewind(self):
+        self._batches = None
+
+
+def quantize_int8(model_name, dataset_path, limit=300, method="minmax"):
+    """
+    Static int8 quantisation (QDQ, per-channel weights) calibrated on faces from `dataset_path`.
+
+    :return: Path of the quantised model.
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_static, CalibrationMethod, QuantFormat, QuantType
+
+    source = onnx_model_path(model_name, "fp32")
+    target = onnx_model_path(model_name, "int8")
+    img_paths = calibration_images(dataset_path, limit)
+    if not img_paths:
+        raise ValueError(f"No calibration images found in {dataset_path}")
+
+    input_name = ort.InferenceSession(source, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    reader = DatasetCalibrationReader(img_paths, input_name, get_input_size(model_name))
+    quantize_static(
+        source,
+        target,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method={"minmax": CalibrationMethod.MinMax, "entropy": CalibrationMethod.Entropy}[method],
+    )
+    print(f"Calibrated on {len(img_paths)} images, wrote {target}")
+    return target
+
+
+def convert_fp16(model_name):
+    """Half-precision weights and activations, keeping float32 inputs and outputs."""
+    import onnx
+    from onnxconverter_common import float16
+
+    source = onnx_model_path(model_name, "fp32")
+    target = onnx_model_path(model_name, "fp16")
+    model = float16.convert_float_to_float16(onnx.load(source), keep_io_types=True)
+    onnx.save(model, target)
+    print(f"Wrote {target}")
+    return target
+
+
+def main():
+    from face_recognition import face_recognition_model
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--precision", choices=("fp16", "int8"), required=True)
+    parser.add_argument("--model", default=face_recognition_model)
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--calibration-images", type=int, default=300)
+    parser.add_argument("--method", choices=("minmax", "entropy"), default="minmax")
+    args = parser.parse_args()
+
+    if not os.path.exists(onnx_model_path(args.model, "fp32")):
+        raise SystemExit(f"{onnx_model_path(args.model, 'fp32')} not found; export it first "
+                         f"(python -m benchmarks.backend_parity --export {onnx_model_path(args.model, 'fp32')})")
+    if args.precision == "int8":
+        quantize_int8(args.model, args.dataset, args.calibration_images, args.method)
+    else:
+        convert_fp16(args.model)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, unquote
+from sqlalchemy import or_
+from db import db
+from models import Recording
+
+# Days of bucket listings re-checked by each reconciliation run
+RECONCILE_DAYS = 2
+
+# Seconds between reconciliation runs
+RECONCILE_INTERVAL = 15 * 60
+
+# Stale rows removed per DELETE statement
+RECONCILE_DELETE_CHUNK = 500
+
+# Remembers whether the one-off full backfill from the bucket has been done
+RECONCILE_STATE_FILE = os.path.join('recordings', 'reconcile_state.json')
+
+_app = None
+
+
+def init_app(app):
+    """Remember the app so worker threads can open an app context to write rows."""
+    global _app
+    _app = app
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def record_recording(blob_name, url, size_bytes, metadata):
+    """
+    Insert (or update) the recordings row for an uploaded video.
+
+    :param metadata: Dict with camera_id, started_at/ended_at (ISO strings) and identities.
+    """
+    if _app is None:
+        logging.warning("Recordings index not initialised; skipping row for %s", blob_name)
+        return
+    metadata = metadata or {}
+    started_at = _parse_time(metadata.get("started_at")) or datetime.now()
+    ended_at = _parse_time(metadata.get("ended_at"))
+    with _app.app_context():
+        recording = Recording.query.filter_by(blob_name=blob_name).first() or Recording(blob_name=blob_name, url=url, started_at=started_at)
+        recording.url = url
+        recording.camera_id = metadata.get("camera_id")
+        recording.started_at = started_at
+        recording.ended_at = ended_at
+        recording.duration = (ended_at - started_at).total_seconds() if ended_at else None
+        recording.size_bytes = size_bytes
+        recording.identities = ",".join(metadata.get("identities") or []) or None
+        db.session.add(recording)
+        db.session.commit()
+
+
+def list_recordings(start_date, end_date, camera_id=None, page=1, per_page=50):
+    """
+    Recordings that started within [start_date, end_date] (both inclusive, YYYY-MM-DD),
+    newest first, as one indexed query.
+
+    :return: (list of recording dicts, total count)
+    """
+    start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
+    end_datetime = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+
+    query = Recording.query.filter(Recording.started_at >= start_datetime, Recording.started_at < end_datetime)
+    if camera_id is not None:
+        query = query.filter(Recording.camera_id == camera_id)
+    pagination = query.order_by(Recording.started_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    return [recording.to_dict() for recording in pagination.items], pagination.total
+
+
+def blob_name_from_url(url, bucket_name):
+    """
+    Object name of a recording from its public URL, as stored in `Recording.blob_name`.
+
+    Accepts https://<host>/<bucket>/<quoted name> as produced by `blob.public_url`, or a bare name.
+    """
+    path = unquote(urlparse(url).path if "://" in url else url)
+    prefix = f"/{bucket_name}/"
+    if path.startswith(prefix):
+        return path[len(prefix):]
+    return path.lstrip("/")
+
+
+def delete_recording_by_blob(blob_name):
+    Recording.query.filter(Recording.blob_name == blob_name).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _row_from_blob(blob):
+    metadata = blob.metadata or {}
+    started_at = _parse_time(metadata.get("started_at")) or blob.time_created.replace(tzinfo=None)
+    ended_at = _parse_time(metadata.get("ended_at"))
+    camera_id = metadata.get("camera_id")
+    return dict(
+        url=blob.public_url,
+        camera_id=int(camera_id) if camera_id not in (None, "", "None") else None,
+        started_at=started_at,
+        ended_at=ended_at,
+        duration=(ended_at - started_at).total_seconds() if ended_at else None,
+        size_bytes=blob.size,
+        identities=metadata.get("identities") or None,
+    )
+
+
+def _day_prefixes(days):
+    # Recordings are named recordings/<dd-mm-yy-HH-MM-SS>..., so a day is a name prefix
+    today = datetime.now()
+    for offset in range(days):
+        day = (today - timedelta(days=offset)).strftime("%d-%m-%y")
+        for sep in ("/", "\\"):
+            yield f"recordings{sep}{day}"
+
+
+def reconcile(bucket, extension=".mp4"):
+    """
+    Sync the recordings table with the bucket.
+
+    The first run lists the whole bucket once to backfill existing videos;
+    later runs only list the name prefixes of the last RECONCILE_DAYS days.
+    """
+    full = not os.path.exists(RECONCILE_STATE_FILE)
+    if full:
+        listings = [bucket.list_blobs()]
+    else:
+        listings = [bucket.list_blobs(prefix=prefix) for prefix in _day_prefixes(RECONCILE_DAYS)]
+
+    seen = set()
+    added = 0
+    with _app.app_context():
+        # Names already indexed in the listed range, in one query, diffed against the listing in Python
+        query = db.session.query(Recording.blob_name)
+        if not full:
+            query = query.filter(or_(*(Recording.blob_name.startswith(prefix) for prefix in _day_prefixes(RECONCILE_DAYS))))
+        existing = {name for (name,) in query}
+
+        for blobs in listings:
+            for blob in blobs:
+                if not blob.name.endswith(extension) or ".part" in blob.name:
+                    continue
+                seen.add(blob.name)
+                if blob.name not in existing:
+                    db.session.add(Recording(blob_name=blob.name, **_row_from_blob(blob)))
+                    added += 1
+
+        # Rows whose video was deleted from the bucket directly; chunked to stay under bound-parameter limits
+        stale = sorted(existing - seen)
+        for i in range(0, len(stale), RECONCILE_DELETE_CHUNK):
+            chunk = stale[i:i + RECONCILE_DELETE_CHUNK]
+            Recording.query.filter(Recording.blob_name.in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+
+    os.makedirs(os.path.dirname(RECONCILE_STATE_FILE), exist_ok=True)
+    with open(RECONCILE_STATE_FILE, "w") as f:
+        json.dump({"last_run": datetime.now().isoformat(), "full": full}, f)
+    logging.info(f"Recordings reconciled: {added} added, {len(stale)} removed.")
+
+
+def start_reconciliation(bucket, interval=RECONCILE_INTERVAL):
+    def loop():
+        while True:
+            try:
+                reconcile(bucket)
+            except Exception as e:
+                logging.error(f"Recordings reconciliation failed: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="recordings-reconcile", daemon=True).start()
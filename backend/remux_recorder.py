@@ -0,0 +1,161 @@
+import os
+import time
+import logging
+import threading
+import datetime
+import ffmpeg
+
+# "reencode" writes decoded frames with cv2.VideoWriter, "remux" copies the camera's own packets.
+# Known limitation of "remux": ffmpeg opens its own RTSP session next to the CamGear reader, so each
+# camera serves two streams. Cameras with a session limit may refuse the second one; check the
+# camera's maximum number of RTSP clients (or put a restreaming proxy in front of it) before enabling it
+RECORDING_MODE = os.getenv("RECORDING_MODE", "reencode")
+
+# Length of the rolling stream-copy segments, in seconds
+SEGMENT_SECONDS = 2
+
+# Segments older than this are deleted unless an event still needs them
+SEGMENT_RETENTION = 30
+
+SEGMENT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+class SegmentRecorder:
+    """
+    Continuously remuxes a camera's H.264/H.265 stream into short MP4 segments.
+
+    ffmpeg copies the packets without decoding or re-encoding them, and the
+    segment muxer only cuts on keyframes, so every segment starts on a
+    keyframe. An event recording is the concatenation (again stream copy) of
+    the segments that cover the event, including the pre-roll before it.
+
+    ffmpeg reads `source` itself, so for an RTSP camera this is a second session
+    alongside the one the frame pipeline reads from (see RECORDING_MODE).
+
+    :param source: RTSP URL, or a local video file as a stand-in source for testing.
+    :param segment_dir: Directory for this camera's rolling segments.
+    :param preroll_seconds: Footage to include before the event started.
+    """
+
+    def __init__(self, camera_id, source, segment_dir, preroll_seconds=5.0,
+                 segment_seconds=SEGMENT_SECONDS, retention=SEGMENT_RETENTION):
+        self.camera_id = camera_id
+        self.source = source
+        self.segment_dir = segment_dir
+        self.preroll_seconds = preroll_seconds
+        self.segment_seconds = segment_seconds
+        self.retention = max(retention, preroll_seconds + 4 * segment_seconds)
+        self.event_start = None
+        self._process = None
+        self._running = threading.Event()
+        self._lock = threading.Lock()
+
+    def _input_options(self):
+        if self.source.startswith("rtsp://"):
+            return {"rtsp_transport": "tcp"}
+        # Read files at their native rate so they behave like a live camera
+        return {"re": None}
+
+    def start(self):
+        os.makedirs(self.segment_dir, exist_ok=True)
+        pattern = os.path.join(self.segment_dir, f"{SEGMENT_TIME_FORMAT}.mp4")
+        self._process = (
+            ffmpeg
+            .input(self.source, **self._input_options())
+            .output(pattern, map="0:v", c="copy", f="segment", segment_time=self.segment_seconds,
+                    segment_format="mp4", reset_timestamps=1, strftime=1)
+            .global_args("-loglevel", "error")
+            .run_async(quiet=True)
+        )
+        self._running.set()
+        threading.Thread(target=self._cleanup_loop, name=f"segments-{self.camera_id}", daemon=True).start()
+        logging.info(f"Stream-copy recorder started for camera {self.camera_id}.")
+        return self
+
+    def stop(self):
+        self._running.clear()
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)
+            except Exception:
+                self._process.kill()
+
+    def _segments(self):
+        """(start_time, path) of the segments on disk, oldest first."""
+        segments = []
+        for name in os.listdir(self.segment_dir):
+            if not name.endswith(".mp4"):
+                continue
+            try:
+                start = datetime.datetime.strptime(name[:-4], SEGMENT_TIME_FORMAT).timestamp()
+            except ValueError:
+                continue
+            segments.append((start, os.path.join(self.segment_dir, name)))
+        return sorted(segments)
+
+    def _cleanup_loop(self):
+        while self._running.is_set():
+            time.sleep(self.segment_seconds)
+            with self._lock:
+                cutoff = time.time() - self.retention
+                if self.event_start is not None:
+                    cutoff = min(cutoff, self.event_start - self.preroll_seconds - self.segment_seconds)
+                for start, path in self._segments():
+                    if start >= cutoff:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def start_event(self):
+        with self._lock:
+            self.event_start = time.time()
+
+    def finish_event(self, output_path, on_done):
+        """
+        Concatenate the segments covering the current event into `output_path`
+        in the background, then call `on_done(output_path)`.
+        """
+        with self._lock:
+            event_start, self.event_start = self.event_start, None
+        if event_start is None:
+            return
+        event_end = time.time()
+        threading.Thread(
+            target=self._write_event, args=(event_start, event_end, output_path, on_done), daemon=True
+        ).start()
+
+    def _write_event(self, event_start, event_end, output_path, on_done):
+        # Wait until the segment containing the end of the event has been closed
+        deadline = event_end + 3 * self.segment_seconds
+        while time.time() < deadline and not any(start > event_end for start, _ in self._segments()):
+            time.sleep(0.5)
+
+        first = event_start - self.preroll_seconds - self.segment_seconds
+        parts = [path for start, path in self._segments() if first <= start <= event_end]
+        if not parts:
+            logging.error(f"No stream-copy segments found for camera {self.camera_id} event.")
+            return
+
+        list_path = output_path + ".txt"
+        with open(list_path, "w") as f:
+            for path in parts:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            (
+                ffmpeg
+                .input(list_path, f="concat", safe=0)
+                .output(output_path, c="copy", movflags="+faststart")
+                .global_args("-loglevel", "error")
+                .run(quiet=True, overwrite_output=True)
+            )
+        except ffmpeg.Error as e:
+            logging.error(f"Could not remux event for camera {self.camera_id}: {e}")
+            return
+        finally:
+            os.remove(list_path)
+
+        print(f"Recording stopped. Video saved: {output_path}")
+        on_done(output_path)
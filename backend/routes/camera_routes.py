@@ -1,22 +1,88 @@
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, jsonify, request, Response
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, create_access_token, verify_jwt_in_request
 from models import Camera
 from camera import start_ip_camera, start_web_camera, camera_streams_dict, camera_streams
 import threading
 import datetime
-from storage import list_videos_in_date_range, bucket
+from storage import bucket, job_queue
+from recordings_index import list_recordings, delete_recording_by_blob, blob_name_from_url
+from uploader import upload_stats
+from live_stream import live_stream
 from urllib.parse import unquote
 from models import  VideoDeletionAudit, Camera
 from db import db
 import logging
 from flask_cors import cross_origin
-from alert import check_alert
+from alert import check_alert, alert_engine
+from notifications import notification_stats
 from face_recognition import recognize_faces
+from camera_session import motion_stats, recording_stats
+from pipeline import pipeline_stats
+from inference_pool import inference_pool_stats
+from metrics import metrics, METRICS_TOKEN
+
+
+# Stats each component keeps about itself, served by /api/stats/<component> and read by /metrics
+STATS_SOURCES = {
+    "motion": motion_stats,            # gated vs. processed frames per camera, for tuning the motion thresholds
+    "pipeline": pipeline_stats,        # per-stage FPS and queue depth of every running camera
+    "inference": inference_pool_stats,  # worker pool load and per-camera task counts
+    "jobs": job_queue.stats,           # length and latency of the transcode/upload queue
+    "uploads": upload_stats.as_dict,   # upload throughput, retries and bytes in flight
+    "stream": live_stream.stats,       # viewers per camera with their current frame rate and quality
+    "alerts": alert_engine.stats,      # alert engine queue and counters
+    "notifications": notification_stats,  # delivery counters and enqueue-to-delivery latency
+}
+
+
+def collect_stats_metrics():
+    """Gauges for /metrics, read from the stats the components already keep."""
+    for camera_id, stages in pipeline_stats().items():
+        for stage, stats in stages.items():
+            yield "camera_stage_fps", "Frames per second through each pipeline stage", {"camera": camera_id, "stage": stage}, stats["fps"]
+            if "queue_depth" in stats:
+                yield "camera_queue_depth", "Frames waiting in front of a pipeline stage", {"camera": camera_id, "stage": stage}, stats["queue_depth"]
+                yield "camera_dropped_frames", "Stale frames dropped in front of a pipeline stage", {"camera": camera_id, "stage": stage}, stats["dropped"]
+    for camera_id, recording in recording_stats().items():
+        yield "camera_recording_active", "Whether an event recording writer is open", {"camera": camera_id}, recording
+    for camera_id, stats in motion_stats().items():
+        for key, value in stats.items():
+            yield f"camera_motion_{key}", "Motion gate counters", {"camera": camera_id}, value
+    for camera_id, stats in live_stream.stats().items():
+        yield "live_stream_viewers", "Viewers per camera and mode", {"camera": camera_id, "mode": "live"}, len(stats["live_viewers"])
+        yield "live_stream_viewers", "Viewers per camera and mode", {"camera": camera_id, "mode": "thumbnail"}, stats["thumbnail_viewers"]
+        yield "live_stream_viewers", "Viewers per camera and mode", {"camera": camera_id, "mode": "mjpeg"}, stats["mjpeg_viewers"]
+
+    pool = inference_pool_stats()
+    for camera_id, pending in pool.get("pending", {}).items():
+        yield "inference_pending", "Inference tasks queued per camera", {"camera": camera_id}, pending
+    for prefix, stats in (
+        ("inference_pool", pool),
+        ("jobs", job_queue.stats()),
+        ("uploads", upload_stats.as_dict()),
+        ("alerts", alert_engine.stats()),
+        ("notifications", notification_stats()),
+    ):
+        for key, value in stats.items():
+            yield f"{prefix}_{key}", f"{prefix} {key.replace('_', ' ')}", {}, value
+
+
+metrics.register_collector(collect_stats_metrics)
 
 
 def create_camera_routes(app, socketio):
     camera_bp = Blueprint('camera', __name__)
 
+    @camera_bp.route('/metrics', methods=['GET'])
+    def get_metrics():
+        # Prometheus scrape endpoint: needs the METRICS_TOKEN bearer token, or comes from localhost when none is set
+        if METRICS_TOKEN:
+            if request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+                return jsonify({'message': 'Unauthorized'}), 401
+        elif request.remote_addr not in ('127.0.0.1', '::1'):
+            return jsonify({'message': 'Set METRICS_TOKEN to scrape /metrics remotely'}), 403
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 
 
 
@@ -39,12 +105,19 @@ def create_camera_routes(app, socketio):
         except ValueError:
             return jsonify({"error": "Invalid date format. Please use YYYY-MM-DD."}), 400
 
-        videos = list_videos_in_date_range(start_date, end_date)
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 500)
+        camera_id = request.args.get('camera_id', type=int)
+
+        # Indexed lookup in the recordings table instead of listing the whole bucket
+        videos, total = list_recordings(start_date, end_date, camera_id=camera_id, page=page, per_page=per_page)
         
         if not videos:
             return jsonify({"message": "No videos found for the selected date range."}), 404
 
-        return jsonify(videos), 200
+        response = jsonify(videos)
+        response.headers['X-Total-Count'] = str(total)
+        return response, 200
 
     @camera_bp.route('/api/delete_video', methods=['DELETE'])
     @jwt_required()
@@ -55,11 +128,8 @@ def create_camera_routes(app, socketio):
             return jsonify({"error": "Video URL is required"}), 400
 
         try:
-            # Decode the URL
-            decoded_url = unquote(video_url)
-            
-            # Extract the blob name from the decoded URL
-            blob_name = decoded_url.split('/')[-1]
+            # The object name as stored in the recordings table, from the video's public URL
+            blob_name = blob_name_from_url(video_url, bucket.name)
 
             # Delete the video from the bucket
             blob = bucket.blob(blob_name)
@@ -70,6 +140,7 @@ def create_camera_routes(app, socketio):
 
             # Delete the video
             blob.delete()
+            delete_recording_by_blob(blob_name)
             
             # Log the deletion in the audit trail
             deleted_by = get_jwt_identity()  # Get the user identity from the JWT
@@ -212,6 +283,43 @@ def create_camera_routes(app, socketio):
         return jsonify({'message': f'Camera {camera_ip} is not running'}), 400
 
 
+    @camera_bp.route('/api/stats', methods=['GET'])
+    @camera_bp.route('/api/stats/<component>', methods=['GET'])
+    @jwt_required()
+    def get_stats(component=None):
+        # Runtime stats of one component (see STATS_SOURCES), or of all of them
+        if component is None:
+            return jsonify({name: stats() for name, stats in STATS_SOURCES.items()}), 200
+        stats = STATS_SOURCES.get(component)
+        if stats is None:
+            return jsonify({'error': f"Unknown component '{component}'", 'components': list(STATS_SOURCES)}), 404
+        return jsonify(stats()), 200
+
+    @camera_bp.route('/api/cameras/<int:camera_id>/stream_token', methods=['POST'])
+    @jwt_required()
+    def camera_stream_token(camera_id):
+        # Short-lived token that only opens this camera's MJPEG stream, so it can go in an <img> URL
+        expires = app.config['MJPEG_TOKEN_EXPIRES']
+        token = create_access_token(
+            identity=get_jwt_identity(),
+            additional_claims={'scope': 'mjpeg', 'camera_id': camera_id},
+            expires_delta=expires,
+        )
+        return jsonify({'token': token, 'expires_in': int(expires.total_seconds())}), 200
+
+    @camera_bp.route('/api/cameras/<int:camera_id>/mjpeg', methods=['GET'])
+    def camera_mjpeg(camera_id):
+        # For simple viewers (<img src=...?jwt=<stream_token>>): reads the same encoded frames as the sockets.
+        # Only this route reads tokens from the query string, and only accepts the camera-scoped ones
+        verify_jwt_in_request(locations=['query_string'])
+        claims = get_jwt()
+        if claims.get('scope') != 'mjpeg' or claims.get('camera_id') != camera_id:
+            return jsonify({'message': 'A stream token for this camera is required'}), 403
+        return Response(
+            live_stream.mjpeg_stream(camera_id, socketio.sleep),
+            mimetype='multipart/x-mixed-replace; boundary=frame',
+        )
+
     # Add this route in app.py to get the status of all cameras
     @camera_bp.route('/api/camera_status', methods=['GET'])
     @jwt_required()
@@ -1,60 +1,93 @@
-from google.cloud import storage
 import os
-import threading
 import requests
 import ffmpeg
-from datetime import datetime
+from jobs import JobQueue, run_niced
+from uploader import get_storage_client, upload_file
+from recordings_index import record_recording
+from metrics import stage_timer
 
 BUCKET_NAME = "video-security-bucket123456"
 API_ENDPOINT = "http://10.242.104.90:5000/recorded_video"
 
-STORAGE_CLIENT = storage.Client.from_service_account_json('credentials.json')
-bucket = STORAGE_CLIENT.get_bucket(BUCKET_NAME)
+# Post-recording work runs on a persistent queue instead of a thread per recording
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+TRANSCODE_NICE = int(os.getenv("TRANSCODE_NICE", 10))
+# Lower values run first
+UPLOAD_PRIORITY = 5
+TRANSCODE_PRIORITY = 10
 
-def upload_to_bucket(blob_name, path_to_file):
-    blob = bucket.blob(blob_name)
-    blob.content_type = 'video/mp4'
+STORAGE_CLIENT = get_storage_client()
+# bucket() doesn't make a request, so importing this module stays offline
+bucket = STORAGE_CLIENT.bucket(BUCKET_NAME)
 
-    blob.upload_from_filename(path_to_file)
-
-    blob.patch()
-    blob.make_public()
+def upload_to_bucket(blob_name, path_to_file, metadata=None):
+    blob = upload_file(bucket, blob_name, path_to_file, content_type='video/mp4', metadata=metadata)
 
     os.remove(path_to_file)
 
     print(f"A new file by the name of {blob_name} was created in your bucket {BUCKET_NAME}")
     return blob.public_url
 
-def handle_detection(path_to_file):
-    def action_thread(path_to_file):
-        output_path = path_to_file.split(".mp4")[0] + "-out.mp4"
-        ffmpeg.input(path_to_file).output(output_path, vf='scale=-1:720').run()
+def transcode_recording(payload):
+    path_to_file = payload["path"]
+    output_path = payload["output_path"]
+    if os.path.exists(path_to_file):
+        args = ffmpeg.input(path_to_file).output(output_path, vf='scale=-1:720').overwrite_output().compile()
+        # Lower priority so incident bursts don't starve the recognition threads
+        run_niced(args, nice=TRANSCODE_NICE)
         os.remove(path_to_file)
-        url = upload_to_bucket(path_to_file, output_path)
-        data = {
-            "url": url,
-        }
-        requests.post(API_ENDPOINT, json=data)
-    
-    thread = threading.Thread(target=action_thread, args=(path_to_file,))
-    thread.start()
+    elif not os.path.exists(output_path):
+        raise FileNotFoundError(path_to_file)
+    job_queue.submit(
+        "upload",
+        {"blob_name": path_to_file, "path": output_path, "metadata": payload.get("metadata")},
+        priority=UPLOAD_PRIORITY,
+    )
 
 
-def list_videos_in_date_range(start_date, end_date, extension=".mp4"):
-    # Convert the string dates to datetime objects
-    start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-    end_datetime = datetime.strptime(end_date, '%Y-%m-%d')
+def upload_recording(payload):
+    metadata = payload.get("metadata") or {}
+    # Progress is kept in the payload so a retry doesn't repeat finished steps
+    if "url" not in payload:
+        if not os.path.exists(payload["path"]):
+            print(f"Recording {payload['path']} is gone; nothing to upload.")
+            return
+        payload["size_bytes"] = os.path.getsize(payload["path"])
+        blob_metadata = {
+            key: ",".join(value) if isinstance(value, list) else str(value)
+            for key, value in metadata.items() if value is not None
+        }
+        with stage_timer("upload", metadata.get("camera_id"), always=True):
+            payload["url"] = upload_to_bucket(payload["blob_name"], payload["path"], metadata=blob_metadata)
+    if not payload.get("indexed"):
+        record_recording(payload["blob_name"], payload["url"], payload.get("size_bytes"), metadata)
+        payload["indexed"] = True
+    response = requests.post(API_ENDPOINT, json={"url": payload["url"]}, timeout=10)
+    response.raise_for_status()
+
 
-    matching_files = []
+job_queue = JobQueue(workers=JOB_WORKERS)
+job_queue.register("transcode", transcode_recording)
+job_queue.register("upload", upload_recording)
 
-    # Iterate over the blobs (objects) in the bucket
-    for blob in bucket.list_blobs():
-        # Check if the blob name ends with the desired file extension
-        blob_created_naive = blob.time_created.replace(tzinfo=None)
-        if blob.name.endswith(extension):
-            # Check if blob creation date is within the desired range
-            if start_datetime <= blob_created_naive <= end_datetime:
-                matching_files.append({"url": blob.public_url, "date": blob.time_created})
 
-    return matching_files
+def handle_detection(path_to_file, transcode=True, metadata=None):
+    """
+    Queue a finished recording for (optional) transcode and upload.
 
+    :param metadata: camera_id, started_at/ended_at (ISO strings) and identities, stored with the video.
+    """
+    if transcode:
+        output_path = path_to_file.split(".mp4")[0] + "-out.mp4"
+        job_queue.submit(
+            "transcode",
+            {"path": path_to_file, "output_path": output_path, "metadata": metadata},
+            priority=TRANSCODE_PRIORITY,
+        )
+    else:
+        # Stream-copied recordings are uploaded as-is, without a second encode
+        job_queue.submit(
+            "upload",
+            {"blob_name": path_to_file, "path": path_to_file, "metadata": metadata},
+            priority=UPLOAD_PRIORITY,
+        )
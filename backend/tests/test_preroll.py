@@ -0,0 +1,56 @@
+"""
+Pre-roll ring buffer: bounded memory, oldest frames dropped first, frames
+written back in order.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from preroll import PrerollBuffer
+
+
+class FrameLog:
+    def __init__(self):
+        self.levels = []
+
+    def write(self, frame):
+        self.levels.append(int(round(frame.mean())))
+
+
+def frame(level, rng):
+    # Noise keeps the JPEG sizes realistic, so the byte cap is actually reached
+    image = rng.integers(0, 16, (120, 160, 3), dtype=np.uint8)
+    image += np.uint8(level)
+    return image
+
+
+def test_byte_cap_keeps_newest_frames_in_order():
+    rng = np.random.default_rng(0)
+    preroll = PrerollBuffer(seconds=10.0, max_bytes=60_000, fps=20.0)
+    for i in range(300):
+        preroll.push(frame(i % 200, rng), now=i * 0.051)
+        assert preroll.nbytes <= preroll.max_bytes
+
+    kept = len(preroll)
+    assert 0 < kept < 300
+    log = FrameLog()
+    preroll.flush(log, (160, 120))
+    assert len(preroll) == 0 and preroll.nbytes == 0
+    expected = [i % 200 + 8 for i in range(300 - kept, 300)]
+    assert log.levels == pytest.approx(expected, abs=2)
+
+
+def test_drops_frames_older_than_seconds():
+    rng = np.random.default_rng(1)
+    preroll = PrerollBuffer(seconds=1.0, max_bytes=8 * 1024 * 1024, fps=10.0)
+    for i in range(50):
+        preroll.push(frame(100, rng), now=i * 0.101)
+    assert len(preroll) == 10
+
+
+def test_frame_larger_than_cap_is_skipped():
+    rng = np.random.default_rng(2)
+    preroll = PrerollBuffer(seconds=1.0, max_bytes=1000, fps=10.0, quality=100)
+    preroll.push(rng.integers(0, 256, (120, 160, 3), dtype=np.uint8), now=0.0)
+    assert len(preroll) == 0
@@ -0,0 +1,71 @@
+"""
+Stream-copy recording from a short local file standing in for a camera.
+
+Needs the ffmpeg binary on PATH and the ffmpeg-python package.
+"""
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+import pytest
+
+pytest.importorskip("ffmpeg")
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+
+from remux_recorder import SegmentRecorder
+
+
+def make_clip(path, seconds=10, fps=10):
+    # H.264 with a keyframe every second, like a typical camera GOP
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size=320x240:rate={fps}",
+        "-c:v", "libx264", "-g", str(fps), "-pix_fmt", "yuv420p", str(path),
+    ], check=True)
+
+
+def keyframe_flags(path):
+    """iskey flag of every decoded frame, in order."""
+    output = subprocess.run(
+        ["ffmpeg", "-v", "info", "-i", str(path), "-vf", "showinfo", "-f", "null", "-"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    return [flag == "1" for flag in re.findall(r"iskey:(\d)", output)]
+
+
+def decode_errors(path):
+    return subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", str(path), "-f", "null", "-"], capture_output=True, text=True,
+    ).stderr.strip()
+
+
+def test_records_segments_and_concatenates_an_event(tmp_path):
+    clip = tmp_path / "camera.mp4"
+    make_clip(clip)
+    segment_dir = tmp_path / "segments"
+    output = tmp_path / "event.mp4"
+    done = threading.Event()
+
+    recorder = SegmentRecorder(1, str(clip), str(segment_dir), preroll_seconds=1.0).start()
+    try:
+        time.sleep(3)
+        recorder.start_event()
+        time.sleep(3)
+        recorder.finish_event(str(output), lambda path: done.set())
+        assert done.wait(timeout=20), "event recording was not written"
+    finally:
+        recorder.stop()
+
+    segments = [path for _, path in recorder._segments()]
+    assert len(segments) >= 3
+    for path in segments:
+        flags = keyframe_flags(path)
+        assert flags and flags[0], f"{path} does not start on a keyframe"
+
+    assert output.exists()
+    assert decode_errors(output) == ""
+    flags = keyframe_flags(output)
+    assert flags[0]
+    # The 3 s event plus its pre-roll, in whole 2 s segments
+    assert len(flags) >= 40
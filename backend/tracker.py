@@ -0,0 +1,125 @@
+import itertools
+import time
+import cv2
+import numpy as np
+
+# Size of the grayscale thumbnail used to notice that a tracked face has changed
+SIGNATURE_SIZE = (16, 16)
+
+
+def iou(box_a, box_b):
+    """Intersection over union of two (x, y, w, h) boxes."""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def crop_signature(frame, box):
+    """Tiny normalised grayscale thumbnail of the face at `box`."""
+    x, y, w, h = box
+    crop = frame[max(0, y):y + h, max(0, x):x + w]
+    if crop.size == 0:
+        return None
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class Track:
+    """A face followed across frames, with its cached identity."""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.person_name = None
+        self.confidence = 0.0
+        self.recognized_at = None
+        self.signature = None
+        self.missed = 0
+
+    @property
+    def identified(self):
+        return self.person_name is not None
+
+
+class FaceTracker:
+    """
+    IoU tracker that gives the faces of one camera stable track IDs.
+
+    Each track remembers the identity it was last recognised as, so
+    `match_face` only needs to run again when the track is new, its crop has
+    changed noticeably, or `refresh_interval` seconds have passed.
+
+    :param iou_threshold: Minimum overlap for a detection to continue a track.
+    :param max_missed: Frames a track survives without a matching detection.
+    :param refresh_interval: Seconds before a known track is re-recognised anyway.
+    :param change_threshold: Mean absolute grey-level change of the crop that forces re-recognition.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=10, refresh_interval=3.0, change_threshold=25.0):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.refresh_interval = refresh_interval
+        self.change_threshold = change_threshold
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes):
+        """
+        Associate this frame's detections with the existing tracks.
+
+        :param boxes: Detected faces in (x, y, w, h) format.
+        :return: Tracks matched or created for `boxes`, in the same order.
+        """
+        pairs = sorted(
+            ((iou(track.box, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True,
+        )
+
+        assigned = [None] * len(boxes)
+        used_tracks = set()
+        for overlap, t, b in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in used_tracks or assigned[b] is not None:
+                continue
+            used_tracks.add(t)
+            assigned[b] = self.tracks[t]
+
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        current = []
+        for box, track in zip(boxes, assigned):
+            if track is None:
+                track = Track(next(self._ids), box)
+                self.tracks.append(track)
+            track.box = box
+            track.missed = 0
+            current.append(track)
+        return current
+
+    def needs_recognition(self, track, frame, now=None):
+        """Whether the cached identity of `track` should be refreshed."""
+        if not track.identified:
+            return True
+        now = time.monotonic() if now is None else now
+        if now - track.recognized_at >= self.refresh_interval:
+            return True
+
+        signature = crop_signature(frame, track.box)
+        if signature is None or track.signature is None:
+            return True
+        return float(np.mean(np.abs(signature - track.signature))) > self.change_threshold
+
+    def set_identity(self, track, frame, person_name, confidence, now=None):
+        track.person_name = person_name
+        track.confidence = confidence
+        track.recognized_at = time.monotonic() if now is None else now
+        track.signature = crop_signature(frame, track.box)
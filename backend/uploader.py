@@ -0,0 +1,210 @@
+"""
+Upload subsystem for recordings.
+
+A single storage client with a pooled HTTP session is shared by every
+upload. Files are sent as chunked resumable uploads; large files are split
+into parts that upload in parallel and are then composed into the final
+object, so a failed part is the only thing re-sent on retry.
+
+Set STORAGE_EMULATOR_HOST (e.g. http://localhost:4443) to run against a local
+fake object store such as fake-gcs-server instead of Google Cloud Storage.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from google.cloud import storage
+from requests.adapters import HTTPAdapter
+
+CREDENTIALS_FILE = 'credentials.json'
+
+# Resumable upload chunk size; must be a multiple of 256 KB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+
+# Files larger than this are uploaded as parallel parts and composed
+PARALLEL_UPLOAD_THRESHOLD = int(os.getenv("PARALLEL_UPLOAD_THRESHOLD", 64 * 1024 * 1024))
+
+# Number of parts uploaded at the same time (also the HTTP connection pool size)
+UPLOAD_PARALLELISM = int(os.getenv("UPLOAD_PARALLELISM", 4))
+
+# Attempts per part before the whole upload is reported as failed
+PART_ATTEMPTS = 3
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_storage_client():
+    """Shared storage client whose HTTP session keeps a pool of connections open."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if os.getenv("STORAGE_EMULATOR_HOST"):
+                    from google.auth.credentials import AnonymousCredentials
+                    client = storage.Client(project="local", credentials=AnonymousCredentials())
+                else:
+                    client = storage.Client.from_service_account_json(CREDENTIALS_FILE)
+                adapter = HTTPAdapter(pool_connections=UPLOAD_PARALLELISM, pool_maxsize=UPLOAD_PARALLELISM * 2)
+                client._http.mount("https://", adapter)
+                client._http.mount("http://", adapter)
+                _client = client
+    return _client
+
+
+class UploadStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.failures = 0
+        self.retries = 0
+        self.bytes_uploaded = 0
+        self.bytes_in_flight = 0
+        self.last_throughput = 0.0
+        self._seconds = 0.0
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def finished(self, nbytes, elapsed):
+        with self._lock:
+            self.uploads += 1
+            self._seconds += elapsed
+            if elapsed > 0:
+                self.last_throughput = nbytes / elapsed
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "uploads": self.uploads,
+                "failures": self.failures,
+                "retries": self.retries,
+                "bytes_uploaded": self.bytes_uploaded,
+                "bytes_in_flight": self.bytes_in_flight,
+                "last_throughput_bps": round(self.last_throughput),
+                "avg_throughput_bps": round(self.bytes_uploaded / self._seconds) if self._seconds else 0,
+            }
+
+
+upload_stats = UploadStats()
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_PARALLELISM, thread_name_prefix="upload-part")
+
+
+class _FileSlice:
+    """Read-only file object exposing `length` bytes of a file starting at `offset`."""
+
+    def __init__(self, path, offset, length):
+        self._file = open(path, "rb")
+        self._file.seek(offset)
+        self._offset = offset
+        self._length = length
+        self._position = 0
+
+    def read(self, size=-1):
+        remaining = self._length - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self._file.read(size)
+        self._position += len(data)
+        return data
+
+    # Resumable uploads check the start position with tell() and rewind with seek() on retry
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._length
+        self._position = min(max(offset, 0), self._length)
+        self._file.seek(self._offset + self._position)
+        return self._position
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self._file.close()
+
+
+def _upload_part(bucket, part_name, path, offset, length, content_type):
+    part = bucket.blob(part_name, chunk_size=UPLOAD_CHUNK_SIZE)
+    # A part left over from an earlier attempt with the right size doesn't need to be sent again
+    existing = bucket.get_blob(part_name)
+    if existing is not None and existing.size == length:
+        return part
+
+    for attempt in range(1, PART_ATTEMPTS + 1):
+        upload_stats.add(bytes_in_flight=length)
+        source = _FileSlice(path, offset, length)
+        try:
+            part.upload_from_file(source, size=length, content_type=content_type)
+            upload_stats.add(bytes_uploaded=length)
+            return part
+        except Exception as e:
+            if attempt == PART_ATTEMPTS:
+                raise
+            upload_stats.add(retries=1)
+            logging.warning(f"Retrying part {part_name} after error: {e}")
+            time.sleep(2 ** attempt)
+        finally:
+            source.close()
+            upload_stats.add(bytes_in_flight=-length)
+
+
+def upload_file(bucket, blob_name, path, content_type='video/mp4', metadata=None, public=True):
+    """
+    Upload `path` to `blob_name` and return the blob.
+
+    Content type, metadata and the public-read ACL go out with the upload
+    itself instead of as separate patch/ACL requests.
+    """
+    size = os.path.getsize(path)
+    start = time.monotonic()
+    blob = bucket.blob(blob_name, chunk_size=UPLOAD_CHUNK_SIZE)
+    blob.metadata = metadata
+    try:
+        if size <= PARALLEL_UPLOAD_THRESHOLD:
+            upload_stats.add(bytes_in_flight=size)
+            try:
+                blob.upload_from_filename(
+                    path, content_type=content_type, predefined_acl='publicRead' if public else None
+                )
+            finally:
+                upload_stats.add(bytes_in_flight=-size)
+            upload_stats.add(bytes_uploaded=size)
+        else:
+            _upload_composite(bucket, blob, path, size, content_type, public)
+    except Exception:
+        upload_stats.add(failures=1)
+        raise
+
+    upload_stats.finished(size, time.monotonic() - start)
+    return blob
+
+
+def _upload_composite(bucket, blob, path, size, content_type, public):
+    # Compose accepts at most 32 source objects
+    part_size = max(PARALLEL_UPLOAD_THRESHOLD // UPLOAD_PARALLELISM, -(-size // 32))
+    part_size = -(-part_size // (256 * 1024)) * 256 * 1024
+    futures = []
+    for index, offset in enumerate(range(0, size, part_size)):
+        part_name = f"{blob.name}.part{index:02d}"
+        length = min(part_size, size - offset)
+        futures.append(_executor.submit(_upload_part, bucket, part_name, path, offset, length, content_type))
+    parts = [future.result() for future in futures]
+
+    blob.content_type = content_type
+    blob.compose(parts)
+    if public:
+        # Compose has no predefined ACL option, so this one still needs its own request
+        blob.make_public()
+    for part in parts:
+        try:
+            part.delete()
+        except Exception as e:
+            logging.warning(f"Could not delete upload part {part.name}: {e}")
@@ -17,13 +17,17 @@ const CameraStream = () => {
     const [editCameraName, setEditCameraName] = useState('');
     const [editCameraRTSP, setEditCameraRTSP] = useState('');
     const [editingCameraId, setEditingCameraId] = useState(null);
+    const [liveCameraId, setLiveCameraId] = useState(null);  // Camera shown at full rate; the rest stay thumbnails
     const cameraRefs = useRef({});  // Use useRef to keep track of image elements
-
-    const socket = io('http://10.242.104.90:5000', {
-        transports: ['websocket'],
-    });
+    const frameUrls = useRef({});  // Object URLs of the frames currently displayed
+    const socketRef = useRef(null);
 
     useEffect(() => {
+        const socket = io('http://10.242.104.90:5000', {
+            transports: ['websocket'],
+        });
+        socketRef.current = socket;
+
         const fetchUserData = async () => {
             try {
                 const token = localStorage.getItem('token');
@@ -76,27 +80,20 @@ const CameraStream = () => {
         fetchCameraStatus();
 
 
-        // Listen for video frames from the server
-        socket.on('video_frame', (data) => {
-            const { camera_ip, frame } = data;
-            const base64Frame = `data:image/jpeg;base64,${btoa(
-                String.fromCharCode(...new Uint8Array(frame))
-            )}`;
-            const imgElement = document.getElementById(`camera-${camera_ip}`);
+        // Frames arrive as binary attachments: (camera_id, jpeg bytes, ack)
+        socket.on('video_frame', (cameraId, frame, ack) => {
+            const imgElement = cameraRefs.current[cameraId];
             if (imgElement) {
-                imgElement.src = base64Frame;
+                const url = URL.createObjectURL(new Blob([frame], { type: 'image/jpeg' }));
+                if (frameUrls.current[cameraId]) {
+                    URL.revokeObjectURL(frameUrls.current[cameraId]);
+                }
+                frameUrls.current[cameraId] = url;
+                imgElement.src = url;  // Directly update image element
             }
-        });
-
-        // Listen for video frames from the server
-        socket.on('video_frame', (data) => {
-            const { camera_id, frame } = data;
-            const base64Frame = `data:image/jpeg;base64,${btoa(
-                String.fromCharCode(...new Uint8Array(frame))
-            )}`;
-
-            if (cameraRefs.current[camera_id]) {
-                cameraRefs.current[camera_id].src = base64Frame;  // Directly update image element
+            // Acknowledge so the server can adapt frame rate and quality to this client
+            if (ack) {
+                ack();
             }
         });
 
@@ -111,9 +108,29 @@ const CameraStream = () => {
 
         return () => {
             socket.disconnect();
+            Object.values(frameUrls.current).forEach((url) => URL.revokeObjectURL(url));
         };
     }, []);
 
+    // Subscribe to every camera: thumbnails for the wall, full rate for the selected one
+    useEffect(() => {
+        const socket = socketRef.current;
+        if (!socket) {
+            return undefined;
+        }
+        cameras.forEach((camera) => {
+            socket.emit('subscribe_camera', {
+                camera_id: camera.id,
+                mode: camera.id === liveCameraId ? 'live' : 'thumbnail',
+            });
+        });
+        return () => {
+            cameras.forEach((camera) => {
+                socket.emit('unsubscribe_camera', { camera_id: camera.id });
+            });
+        };
+    }, [cameras, liveCameraId]);
+
     const toggleSidebar = () => {
         setSidebarOpen(!sidebarOpen);
     };
@@ -296,6 +313,13 @@ const CameraStream = () => {
                                                 style={{ width: '100%', height: 'auto' }}
                                             />
                                             <p>{camera.name}</p>
+                                            <Button
+                                                variant="outlined"
+                                                onClick={() => setLiveCameraId(liveCameraId === camera.id ? null : camera.id)}
+                                                fullWidth
+                                            >
+                                                {liveCameraId === camera.id ? 'Back to Thumbnail' : 'Watch Live'}
+                                            </Button>
                                         </Box>
 
                                         {editingCameraId === camera.id ? (